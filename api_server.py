@@ -8,69 +8,469 @@ Endpoints:
 - GET /export - экспорт результатов
 """
 import os
+import io
+import re
+import csv
+import gzip
+import zlib
 import json
+import time
+import queue
+import uuid
+import shutil
+import atexit
 import threading
 import logging
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, Response, request, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
+from werkzeug.formparser import FormDataParser, MultiPartParser
+from werkzeug.middleware.proxy_fix import ProxyFix
 import config
+from database import DatabasePool
+from progress import RunCounters
 from parser import SteamDBParser
 from itad_parser_main import ITADParserMain
 from steam_parser_main import SteamParserMain
+# После parser: его logging.basicConfig подключает файловый лог, который читает /logs
+from export_steamcharts_csv import export_to_csv, iter_ccu_csv
+from export_errors import export_errors_to_csv, iter_errors_csv
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import psycopg2
+    POSTGRESQL_AVAILABLE = True
+except ImportError:
+    POSTGRESQL_AVAILABLE = False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON-провайдер Flask на orjson: сериализация в C и сразу в bytes.
+    Вывод совпадает со стандартным провайдером (сортировка ключей, формат дат через default);
+    для нестандартных аргументов (indent в debug и т.п.) используется стандартный json.
+    """
+    OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if ORJSON_AVAILABLE else 0
+    
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.OPTIONS).decode()
+    
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs) -> Response:
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+class UploadFormDataParser(FormDataParser):
+    """Разбор multipart с крупным буфером чтения (по умолчанию werkzeug читает тело по 64 KB)"""
+    
+    def _parse_multipart(self, stream, mimetype, content_length, options):
+        parser = MultiPartParser(
+            stream_factory=self.stream_factory,
+            max_form_memory_size=self.max_form_memory_size,
+            max_form_parts=self.max_form_parts,
+            buffer_size=config.UPLOAD_BUFFER_SIZE,
+            cls=self.cls,
+        )
+        boundary = options.get("boundary", "").encode("ascii")
+        if not boundary:
+            raise ValueError("Missing boundary")
+        
+        form, files = parser.parse(stream, boundary, content_length)
+        return stream, form, files
+
+
+class UploadRequest(Request):
+    form_data_parser_class = UploadFormDataParser
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+if ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
+if config.TRUSTED_PROXY_HOPS:
+    # За reverse proxy (nginx): схема, хост и IP клиента - из X-Forwarded-* заголовков
+    hops = config.TRUSTED_PROXY_HOPS
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops, x_prefix=hops)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+# Лимит для текстовых полей формы (файлы пишутся во временный файл). Werkzeug сверяет с ним
+# каждый прочитанный блок multipart вместе с недоразобранным хвостом предыдущего,
+# поэтому он должен быть заметно больше буфера чтения
+app.config['MAX_FORM_MEMORY_SIZE'] = max(500 * 1024, 2 * config.UPLOAD_BUFFER_SIZE)
 app.config['UPLOAD_FOLDER'] = config.DATA_DIR
+# Apache mod_xsendfile: send_file отдает только заголовок X-Sendfile
+app.use_x_sendfile = config.USE_XSENDFILE and config.XSENDFILE_SERVER == 'apache'
+
+
+
+@app.after_request
+def _gzip_json(response):
+    """
+    Сжимать крупные JSON-ответы (/status, /itad/status, /logs и т.п.) для клиентов с gzip.
+    CSV-выгрузки сжимаются отдельно: потоком (_stream_csv) или заранее (/download)
+    """
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not request.accept_encodings['gzip']):
+        return response
+    data = response.get_data()
+    if len(data) < config.JSON_GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, config.JSON_GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# Размер блока при копировании загрузки, если sendfile недоступен
+UPLOAD_COPY_BUFFER = config.UPLOAD_BUFFER_SIZE
+# Сколько секунд клиент может кэшировать экспорт с меткой времени (/download?timestamp=...)
+EXPORT_FILE_MAX_AGE = 3600
+# Размер блока при проверке файла app_ids
+APP_IDS_READ_BLOCK = 1024 * 1024
+# Размер блока при чтении лога с конца (/logs)
+LOG_READ_BLOCK = 64 * 1024
+
+
+
+class ParserState:
+    """
+    Состояние одного вида парсера: постоянный рабочий поток, текущий запуск (Future)
+    и блокировка старта. "Запущен" = Future еще не завершен; проверка и отправка запуска
+    выполняются атомарно в start(), поэтому два одновременных запроса не запустят два парсера.
+    """
+    
+    def __init__(self, name: str):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{name}-parser')
+        self.start_lock = threading.Lock()
+        self.future = None
+        # Остановка SteamCharts - через Event, без записи атрибутов объекта парсера из другого потока
+        self.stop_event = threading.Event()
+        # Счетчики текущего (или последнего) запуска - обновляются парсером в памяти
+        self.counters = None
+        # Объект парсера текущего запуска (ITAD/Steam) - для сигнала остановки
+        self.instance = None
+    
+    def running(self) -> bool:
+        future = self.future
+        return future is not None and not future.done()
+    
+    def start(self, fn, *args, stop_event: threading.Event = None, counters: RunCounters = None):
+        """
+        Отправить запуск в рабочий поток.
+        stop_event/counters нового запуска выставляются под той же блокировкой, что и Future.
+        
+        Returns:
+            Future или None, если парсер уже выполняется
+        """
+        with self.start_lock:
+            if self.running():
+                return None
+            if stop_event is not None:
+                self.stop_event = stop_event
+            if counters is not None:
+                self.counters = counters
+            self.future = self.executor.submit(fn, *args)
+            return self.future
+
 
-# Глобальное состояние парсера
-parser_instance = None
-parser_thread = None
-parser_running = False
+_steamcharts_parser = ParserState('steamcharts')
+_itad_parser = ParserState('itad')
+_steam_parser = ParserState('steam')
 
-# Глобальное состояние ITAD парсера
-itad_parser_instance = None
-itad_parser_thread = None
-itad_parser_running = False
+# Пул подключений к БД, общий для всех запросов (создается лениво)
+_db_pool = None
+_db_pool_lock = threading.Lock()
 
-# Глобальное состояние Steam парсера
-steam_parser_instance = None
-steam_parser_thread = None
-steam_parser_running = False
+
+
+class CacheStats:
+    """Счетчики обращений к кэшу в памяти процесса (hits/misses/evictions) для /admin/cache-stats"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+    
+    def incr(self, key: str, amount: int = 1):
+        with self._lock:
+            self._counts[key] += amount
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        hits, misses = counts.get('hits', 0), counts.get('misses', 0)
+        return {
+            **counts,
+            'hits': hits,
+            'misses': misses,
+            'evictions': counts.get('evictions', 0),
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None
+        }
+
+
+# Кэш тел ответов /status и /itad/status: ключ -> (время, parser_running, готовое тело JSON)
+# Частые опросы в пределах STATUS_CACHE_TTL обслуживаются без запроса к БД
+_status_cache = {}
+_status_cache_lock = threading.Lock()
+_status_cache_stats = {'steamcharts': CacheStats(), 'itad': CacheStats(), 'steam': CacheStats()}
+
+# Потоки для параллельной записи файлов полного экспорта (/export?type=full)
+_export_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='export')
+
+# Ограничение числа одновременных потоковых CSV-выгрузок: каждая держит подключение из пула
+# до конца скачивания, и долгие выгрузки не должны занять весь пул
+_export_slots = threading.BoundedSemaphore(config.EXPORT_MAX_STREAMS)
+
+# Ограничение числа одновременных потоков /events (каждый занимает рабочий поток сервера)
+_events_slots = threading.BoundedSemaphore(config.EVENTS_MAX_CLIENTS)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def run_parser_in_thread(app_ids_file: Path):
-    """Запуск парсера в отдельном потоке"""
-    global parser_instance, parser_running
+def _get_db_pool() -> DatabasePool:
+    """Получить пул подключений, создав его при первом обращении"""
+    global _db_pool
     
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                pool = DatabasePool()
+                atexit.register(pool.close)
+                _db_pool = pool
+    return _db_pool
+
+
+@contextmanager
+def get_db(readonly: bool = False):
+    """
+    Взять подключение к БД из пула на время запроса.
+    readonly=True - для запросов только на чтение (PostgreSQL в autocommit: без лишних BEGIN/ROLLBACK)
+    """
+    db = _get_db_pool().acquire(autocommit=readonly)
     try:
-        parser_running = True
-        logger.info(f"Starting parser with app_ids file: {app_ids_file}")
-        
-        # Копируем файл в стандартное место или используем напрямую
-        # Временно заменяем APP_IDS_FILE в config
-        original_file = config.APP_IDS_FILE
+        yield db
+    finally:
+        db.close()
+
+
+def _validate_app_ids(stream) -> int:
+    """
+    Проверить файл app_ids и вернуть количество ID.
+    
+    Raises:
+        ValueError: с текстом ошибки для ответа 400
+    """
+    try:
+        app_ids_count = _count_app_ids(stream)
+    except ValueError:
+        raise ValueError('Invalid file format. Expected one app ID per line')
+    except Exception as e:
+        raise ValueError(f'Error reading file: {str(e)}')
+    
+    if app_ids_count == 0:
+        raise ValueError('File is empty')
+    return app_ids_count
+
+
+def _accept_upload(file, kind: str) -> tuple:
+    """
+    Проверить загруженный файл app_ids прямо из потока и сохранить его в config.APP_IDS_FILE
+    (на диск попадает только корректный файл, без повторного копирования в потоке парсера).
+    
+    Returns:
+        (имя загруженного файла, путь сохраненного файла, количество app IDs)
+    
+    Raises:
+        ValueError: файл некорректен (текст ошибки - для ответа 400)
+    """
+    filename = secure_filename(file.filename or 'app_ids.txt') or 'app_ids.txt'
+    filepath = Path(config.APP_IDS_FILE)
+    
+    app_ids_count = _validate_app_ids(file.stream)
+    _save_upload(file, filepath)
+    logger.info(f"Received app_ids file for {kind} parser: {filename}, saved to {filepath}")
+    return filename, filepath, app_ids_count
+
+
+def _save_upload(file, filepath: Path):
+    """
+    Сохранить загруженный файл на диск.
+    Если werkzeug уже сбросил загрузку во временный файл, данные копирует ядро (os.sendfile),
+    иначе - shutil.copyfileobj крупными блоками вместо мелких чанков FileStorage.save.
+    Пишем во временный файл рядом и подменяем os.replace: парсер, который еще читает
+    старый файл, не увидит его наполовину перезаписанным
+    """
+    tmp_path = filepath.with_name(filepath.name + '.tmp')
+    try:
+        _copy_upload(file.stream, tmp_path)
+        os.replace(tmp_path, filepath)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _copy_upload(src, filepath: Path):
+    """Скопировать поток загрузки в файл (sendfile, если загрузка уже лежит во временном файле)"""
+    try:
+        src_fd = src.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        src_fd = None  # загрузка в памяти (BytesIO)
+    
+    with open(filepath, 'wb') as dst:
+        if src_fd is not None and hasattr(os, 'sendfile'):
+            try:
+                size = os.fstat(src_fd).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(dst.fileno(), src_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError as e:
+                # Например, macOS поддерживает sendfile только для сокетов
+                logger.debug(f"sendfile failed, falling back to copyfileobj: {e}")
+                dst.seek(0)
+                dst.truncate()
         
-        # Копируем загруженный файл в стандартное место
-        # Преобразуем Path в строки для shutil.copy2
-        import shutil
-        source_path = str(app_ids_file) if isinstance(app_ids_file, Path) else app_ids_file
-        dest_path = str(config.APP_IDS_FILE) if isinstance(config.APP_IDS_FILE, Path) else config.APP_IDS_FILE
-        shutil.copy2(source_path, dest_path)
-        logger.info(f"Copied {source_path} to {dest_path}")
+        src.seek(0)
+        shutil.copyfileobj(src, dst, UPLOAD_COPY_BUFFER)
+
+
+# Байты "чистого" файла app_ids: цифры и переводы строк
+_APP_IDS_PLAIN_BYTES = b'0123456789\n'
+# Блок строк с пробелами и пустыми строками: каждая строка - пустая или одно число
+_APP_IDS_LINES = re.compile(rb'(?:[ \t\v\f]*(?:\d+[ \t\v\f]*)?\n)*').fullmatch
+_APP_ID = re.compile(rb'\d+').findall
+
+
+def _count_app_ids(stream) -> int:
+    """
+    Проверить содержимое app_ids за один проход и вернуть количество ID.
+    Принимает бинарный поток (загрузку file.stream или открытый файл) - загрузку
+    можно проверить до записи на диск и не сохранять вовсе, если она некорректна.
+    Поток читается блоками по APP_IDS_READ_BLOCK, выровненными по концу строки.
+    
+    Raises:
+        ValueError: строка файла не является числом
+    """
+    stream.seek(0)
+    count = 0
+    tail = b''
+    while True:
+        chunk = stream.read(APP_IDS_READ_BLOCK)
+        if not chunk:
+            break
+        block = tail + chunk
+        cut = block.rfind(b'\n') + 1
+        tail = block[cut:]
+        if cut:
+            count += _count_app_ids_block(block[:cut])
+    if tail:
+        count += _count_app_ids_block(tail + b'\n')
+    return count
+
+
+def _count_app_ids_block(block: bytes) -> int:
+    """
+    Проверить блок целых строк и вернуть количество ID в нем.
+    Обычный случай (только цифры, одно число на строку, без пустых строк) проверяется
+    целиком на уровне C: translate ищет посторонние байты, count считает строки.
+    """
+    if b'\r' in block:
+        block = block.replace(b'\r\n', b'\n')
+    if (not block.translate(None, _APP_IDS_PLAIN_BYTES)
+            and not block.startswith(b'\n') and b'\n\n' not in block):
+        return block.count(b'\n')
+    
+    # Пробелы, пустые строки или '\r' как перевод строки - проверяем всем блоком одной регуляркой
+    block = block.replace(b'\r', b'\n')
+    if _APP_IDS_LINES(block):
+        return len(_APP_ID(block))
+    
+    # Блок некорректен - ищем строку для текста ошибки
+    count = 0
+    for raw in block.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if not line.isdigit():
+            raise ValueError(f"Invalid app ID: {line[:50]!r}")
+        count += 1
+    return count
+
+
+def _stop_itad_parser():
+    """Послать сигнал остановки ITAD парсеру (событие общее для ITADParserMain и его парсера цен)"""
+    _itad_parser.stop_event.set()
+
+
+def shutdown_parsers():
+    """
+    Остановить парсеры при завершении процесса: послать сигналы остановки и дождаться
+    рабочих потоков, пока executors еще принимают задачи. Парсеры сами сохраняют
+    checkpoint, а прерванные app_id остаются pending до следующего запуска.
+    Вызывается из gunicorn (worker_exit) и после остановки dev-сервера.
+    """
+    _steamcharts_parser.stop_event.set()
+    _stop_itad_parser()
+    instance = _steam_parser.instance
+    if instance:
+        instance.stop()
+    for state in (_steamcharts_parser, _itad_parser, _steam_parser):
+        state.executor.shutdown(wait=True)
+
+
+def run_parser_in_thread(app_ids_file: Path, stop_event: threading.Event, counters: RunCounters = None):
+    """Запуск парсера в рабочем потоке"""
+    try:
+        logger.info(f"Starting parser with app_ids file: {app_ids_file}")
         
-        parser_instance = SteamDBParser(data_source='steamcharts')
-        parser_instance.run()
+        parser = SteamDBParser(data_source='steamcharts', stop_event=stop_event, counters=counters)
+        parser.run()
         
-        logger.info("Parser completed successfully")
+        if stop_event.is_set():
+            logger.info("Parser stopped")
+        else:
+            logger.info("Parser completed successfully")
     except Exception as e:
         logger.error(f"Parser error: {e}", exc_info=True)
-    finally:
-        parser_running = False
-        parser_instance = None
+
+
+def warmup():
+    """
+    Прогреть сервер до первого запроса: создать пул подключений (DB_POOL_MIN соединений
+    и схема БД) и заполнить кэш /status. Ошибки только логируются - сервер должен
+    стартовать, даже если БД временно недоступна.
+    Вызывается из gunicorn (post_worker_init) после fork, чтобы сокеты не наследовались.
+    """
+    started = time.monotonic()
+    try:
+        _get_status_body()
+        logger.info(f"Warmup completed in {time.monotonic() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"Warmup failed, connections will be opened on first request: {e}")
 
 
 @app.route('/health', methods=['GET'])
@@ -78,14 +478,12 @@ def health():
     """Health check endpoint"""
     try:
         # Проверяем подключение к БД
-        from database import Database
-        db = Database()
-        db_ok = db.use_postgresql or db.db_path.exists()
-        db.close()
+        with get_db(readonly=True) as db:
+            db_ok = db.use_postgresql or db.db_path.exists()
         
         return jsonify({
             'status': 'ok',
-            'parser_running': parser_running,
+            'parser_running': _steamcharts_parser.running(),
             'database_connected': db_ok,
             'postgresql': config.USE_POSTGRESQL
         })
@@ -99,9 +497,7 @@ def health():
 @app.route('/start', methods=['POST'])
 def start_parser():
     """Запуск парсера с файлом app_ids"""
-    global parser_thread, parser_running
-    
-    if parser_running:
+    if _steamcharts_parser.running():
         return jsonify({
             'error': 'Parser is already running',
             'status': 'running'
@@ -119,56 +515,31 @@ def start_parser():
             'error': 'No file selected'
         }), 400
     
-    # Сохраняем файл
-    # Убеждаемся, что filename - строка
-    file_filename = file.filename if file.filename else 'app_ids.txt'
-    if not isinstance(file_filename, str):
-        file_filename = str(file_filename)
-    filename = secure_filename(file_filename)
-    upload_folder = Path(app.config['UPLOAD_FOLDER'])
-    filepath = upload_folder / filename
-    file.save(str(filepath))
-    
-    logger.info(f"Received app_ids file: {filename}, saved to {filepath}")
-    
-    # Проверяем формат файла
     try:
-        with open(filepath, 'r') as f:
-            lines = [line.strip() for line in f if line.strip()]
-            if not lines:
-                return jsonify({
-                    'error': 'File is empty'
-                }), 400
-            
-            # Проверяем, что это числа
-            try:
-                app_ids = [int(line) for line in lines if line.isdigit()]
-                if not app_ids:
-                    return jsonify({
-                        'error': 'No valid app IDs found in file'
-                    }), 400
-            except ValueError:
-                return jsonify({
-                    'error': 'Invalid file format. Expected one app ID per line'
-                }), 400
-        
-        logger.info(f"File validated: {len(app_ids)} app IDs found")
-    except Exception as e:
+        filename, filepath, app_ids_count = _accept_upload(file, 'SteamCharts')
+    except ValueError as e:
         return jsonify({
-            'error': f'Error reading file: {str(e)}'
+            'error': str(e)
         }), 400
+    logger.info(f"File validated: {app_ids_count} app IDs found")
     
-    # Запускаем парсер в отдельном потоке
-    parser_thread = threading.Thread(
-        target=run_parser_in_thread,
-        args=(filepath,),
-        daemon=True
-    )
-    parser_thread.start()
+    # Запускаем парсер в рабочем потоке (повторная проверка - пока шла загрузка, мог стартовать другой запрос)
+    stop_event = threading.Event()
+    counters = RunCounters()
+    future = _steamcharts_parser.start(run_parser_in_thread, filepath, stop_event, counters,
+                                       stop_event=stop_event, counters=counters)
+    if future is None:
+        return jsonify({
+            'error': 'Parser is already running',
+            'status': 'running'
+        }), 400
+    # Разбудить подписчиков /events, когда запуск завершится (future уже в состоянии done)
+    future.add_done_callback(lambda _future: counters.finish())
+    _invalidate_status_cache()
     
     return jsonify({
         'status': 'started',
-        'message': f'Parser started with {len(app_ids)} app IDs',
+        'message': f'Parser started with {app_ids_count} app IDs',
         'file': filename
     }), 200
 
@@ -177,59 +548,148 @@ def start_parser():
 def status():
     """Получить статус парсинга"""
     try:
-        # Получаем статистику из БД
-        from database import Database
-        db = Database()
-        try:
-            stats = db.get_statistics()
-        finally:
-            db.close()
-        
-        total = stats.get('total', 0)
-        completed = stats.get('completed', 0)
-        errors_count = stats.get('errors', 0)
-        
-        progress_percent = 0.0
-        if total > 0:
-            progress_percent = round((completed + errors_count) / total * 100, 2)
-        
-        return jsonify({
-            'parser_running': parser_running,
-            'statistics': {
-                'total_apps': total,
-                'completed': completed,
-                'pending': stats.get('pending', 0),
-                'errors': errors_count,
-                'ccu_records': stats.get('ccu_records', 0),
-                'price_records': stats.get('price_records', 0)
-            },
-            'progress_percent': progress_percent
-        }), 200
+        return _status_response(_get_status_body())
     except Exception as e:
         logger.error(f"Error getting status: {e}", exc_info=True)
         return jsonify({
             'error': str(e),
-            'parser_running': parser_running
+            'parser_running': _steamcharts_parser.running()
         }), 500
 
 
+def _cached_status_body(key: str, running: bool, build) -> str:
+    """
+    Тело ответа статуса из кэша: build(running) вызывается не чаще STATUS_CACHE_TTL
+    или при смене состояния парсера; одновременные запросы ждут одну сборку
+    """
+    stats = _status_cache_stats[key]
+    entry = _status_cache.get(key)
+    if entry is None or entry[1] != running or time.monotonic() - entry[0] >= config.STATUS_CACHE_TTL:
+        with _status_cache_lock:
+            # Повторная проверка: кэш мог обновить другой поток, пока мы ждали lock
+            entry = _status_cache.get(key)
+            now = time.monotonic()
+            if entry is None or entry[1] != running or now - entry[0] >= config.STATUS_CACHE_TTL:
+                if entry is not None:
+                    stats.incr('evictions')
+                stats.incr('misses')
+                entry = (now, running, build(running))
+                _status_cache[key] = entry
+                return entry[2]
+    stats.incr('hits')
+    return entry[2]
+
+
+def _invalidate_status_cache():
+    """Сбросить кэш статусов (после запуска/остановки парсера)"""
+    with _status_cache_lock:
+        for key in _status_cache:
+            _status_cache_stats[key].incr('evictions')
+        _status_cache.clear()
+
+
+def _status_response(body: str):
+    """JSON-ответ статуса; клиенту разрешено кэшировать его столько же, сколько кэширует сервер"""
+    response = app.response_class(body, status=200, mimetype='application/json')
+    if config.STATUS_CACHE_TTL >= 1:
+        response.headers['Cache-Control'] = f'public, max-age={int(config.STATUS_CACHE_TTL)}'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _get_status_body() -> str:
+    """Тело ответа /status из кэша"""
+    return _cached_status_body('steamcharts', _steamcharts_parser.running(), _build_status_body)
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """
+    Поток статуса (Server-Sent Events) вместо частого опроса /status.
+    Кадр (тело /status) отправляется при изменении счетчиков текущего запуска,
+    но не чаще EVENTS_MIN_INTERVAL; при простое - keepalive-комментарий.
+    """
+    if not _events_slots.acquire(blocking=False):
+        return jsonify({
+            'error': 'Too many event streams, poll /status instead'
+        }), 503
+    
+    def generate():
+        deadline = time.monotonic() + config.EVENTS_MAX_DURATION
+        last_body = None
+        seen = (None, None)  # (счетчики, версия) последнего отправленного состояния
+        
+        while time.monotonic() < deadline:
+            counters = _steamcharts_parser.counters
+            body = _get_status_body()
+            if body != last_body:
+                last_body = body
+                yield f"data: {body.rstrip()}\n\n"
+            else:
+                yield ": keepalive\n\n"
+            
+            time.sleep(config.EVENTS_MIN_INTERVAL)
+            
+            if counters is None:
+                time.sleep(config.EVENTS_HEARTBEAT)
+                continue
+            version = seen[1] if seen[0] is counters else None
+            seen = (counters, counters.wait_for_change(version, config.EVENTS_HEARTBEAT))
+    
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(_events_slots.release)
+    return response
+
+
+def _build_status_body(running: bool) -> str:
+    """Собрать тело ответа /status (один запрос статистики к БД)"""
+    counters = _steamcharts_parser.counters
+    
+    # Получаем статистику из БД
+    with get_db(readonly=True) as db:
+        stats = db.get_statistics()
+    
+    total = stats.get('total', 0)
+    completed = stats.get('completed', 0)
+    errors_count = stats.get('errors', 0)
+    
+    progress_percent = 0.0
+    if total > 0:
+        progress_percent = round((completed + errors_count) / total * 100, 2)
+    
+    return app.json.dumps({
+        'parser_running': running,
+        'statistics': {
+            'total_apps': total,
+            'completed': completed,
+            'pending': stats.get('pending', 0),
+            'errors': errors_count,
+            'ccu_records': stats.get('ccu_records', 0),
+            'price_records': stats.get('price_records', 0)
+        },
+        'progress_percent': progress_percent,
+        'current_run': counters.snapshot() if counters is not None else None
+    }) + "\n"
+
+
 @app.route('/stop', methods=['POST'])
 def stop_parser():
     """Остановка парсера"""
-    global parser_instance, parser_running
-    
-    if not parser_running:
+    if not _steamcharts_parser.running():
         return jsonify({
             'status': 'not_running',
             'message': 'Parser is not running'
         }), 200
     
     try:
-        if parser_instance:
-            parser_instance.running = False
-            logger.info("Stopping parser...")
-        
-        parser_running = False
+        _steamcharts_parser.stop_event.set()
+        _invalidate_status_cache()
+        logger.info("Stopping parser...")
         
         return jsonify({
             'status': 'stopping',
@@ -242,63 +702,127 @@ def stop_parser():
         }), 500
 
 
+def _export_timestamp() -> str:
+    """
+    Метка выгрузки для имен файлов: YYYYMMDD_HHMMSS и случайный суффикс.
+    Одной секунды мало - две выгрузки в одну секунду получили бы одно имя
+    (и файл полного экспорта, отдаваемый как неизменный, был бы перезаписан)
+    """
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+
+
+def _stream_csv(make_chunks, filename: str):
+    """
+    Отдать CSV потоком по мере чтения из БД, без временного файла.
+    Клиентам, принимающим gzip, поток сжимается на лету (Content-Encoding: gzip) -
+    повторяющиеся app_id, даты и валюты сжимаются в разы.
+    
+    Генератору нужно собственное подключение: он выполняется уже после выхода из view,
+    поэтому подключение возвращается в пул при закрытии ответа (call_on_close).
+    
+    Returns:
+        Response или None, если генератор не выдал ни одной порции
+    
+    Raises:
+        TimeoutError: уже идут EXPORT_MAX_STREAMS выгрузок (ответ 503)
+    """
+    if not _export_slots.acquire(blocking=False):
+        raise TimeoutError('Too many exports in progress, try again later')
+    
+    try:
+        db = _get_db_pool().acquire()
+    except Exception:
+        _export_slots.release()
+        raise
+    try:
+        chunks = make_chunks(db)
+        # Первая порция читается сразу: ошибки запроса попадут в обработчик view, а не в середину ответа
+        first = next(chunks, None)
+    except Exception:
+        db.close()
+        _export_slots.release()
+        raise
+    
+    if first is None:
+        db.close()
+        _export_slots.release()
+        return None
+    
+    def generate():
+        yield first
+        yield from chunks
+    
+    def release():
+        try:
+            chunks.close()
+            db.close()
+        finally:
+            _export_slots.release()
+    
+    body = generate()
+    headers = {'Content-Disposition': f'attachment; filename={filename}', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        body = _gzip_chunks(body)
+        headers['Content-Encoding'] = 'gzip'
+    
+    response = Response(
+        stream_with_context(body),
+        mimetype='text/csv',
+        headers=headers
+    )
+    response.call_on_close(release)
+    return response
+
+
+def _gzip_chunks(chunks):
+    """Сжимать поток порций (str или уже готовые bytes) в gzip по мере их поступления"""
+    compressor = zlib.compressobj(config.EXPORT_STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @app.route('/export', methods=['GET'])
 def export_data():
     """Экспорт результатов парсинга"""
     try:
         export_type = request.args.get('type', 'full')  # 'full', 'ccu', 'errors'
         
-        from database import Database
-        from export_steamcharts_csv import export_to_csv
-        from export_errors import export_errors_to_csv
-        from pathlib import Path
-        from datetime import datetime
-        
-        db = Database()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
         if export_type == 'ccu':
-            output_file = config.DATA_DIR / f"ccu_export_{timestamp}.csv"
-            try:
-                export_to_csv(db, output_file)
-                if not output_file.exists():
-                    return jsonify({'error': 'Export file not created'}), 500
-                return send_file(str(output_file), as_attachment=True, download_name=f"ccu_export_{timestamp}.csv")
-            finally:
-                db.close()
+            timestamp = _export_timestamp()
+            return _stream_csv(iter_ccu_csv, f"ccu_export_{timestamp}.csv")
         
         elif export_type == 'errors':
-            output_file = config.DATA_DIR / f"errors_export_{timestamp}.csv"
-            try:
-                count = export_errors_to_csv(db, output_file)
-                if count == 0:
-                    return jsonify({'message': 'No errors to export'}), 200
-                if not output_file.exists():
-                    return jsonify({'error': 'Export file not created'}), 500
-                return send_file(str(output_file), as_attachment=True, download_name=f"errors_export_{timestamp}.csv")
-            finally:
-                db.close()
+            timestamp = _export_timestamp()
+            response = _stream_csv(iter_errors_csv, f"errors_export_{timestamp}.csv")
+            if response is None:
+                return jsonify({'message': 'No errors to export'}), 200
+            return response
         
-        else:  # full
-            # Экспортируем оба файла в архив или возвращаем JSON с путями
-            ccu_file = config.DATA_DIR / f"ccu_export_{timestamp}.csv"
-            errors_file = config.DATA_DIR / f"errors_export_{timestamp}.csv"
-            
-            try:
-                export_to_csv(db, ccu_file)
-                export_errors_to_csv(db, errors_file)
-                
-                return jsonify({
-                    'status': 'exported',
-                    'files': {
-                        'ccu': f"/download/ccu?timestamp={timestamp}",
-                        'errors': f"/download/errors?timestamp={timestamp}"
-                    },
-                    'message': 'Export completed. Use /download endpoints to get files.'
-                }), 200
-            finally:
-                db.close()
+        # full
+        # Экспортируем оба файла (или берем готовые, если данные не менялись) и возвращаем JSON с путями.
+        # Метка времени берется из кэша экспорта: повторные запросы получают те же ссылки /download
+        timestamp = _full_export()
         
+        return jsonify({
+            'status': 'exported',
+            'files': {
+                'ccu': f"/download/ccu?timestamp={timestamp}",
+                'errors': f"/download/errors?timestamp={timestamp}"
+            },
+            'message': 'Export completed. Use /download endpoints to get files.'
+        }), 200
+    
+    except TimeoutError as e:
+        # Полный экспорт еще идет в другом запросе или заняты все слоты потоковых выгрузок
+        return jsonify({
+            'status': 'in_progress',
+            'error': str(e)
+        }), 503
     except Exception as e:
         logger.error(f"Error exporting data: {e}", exc_info=True)
         return jsonify({
@@ -306,6 +830,110 @@ def export_data():
         }), 500
 
 
+# Последний полный экспорт: 'done' - {'timestamp', 'version', 'created_at'};
+# 'pending' - Event выгрузки, которая идет прямо сейчас (параллельные запросы ждут ее, а не запускают свою)
+_full_export_cache = {}
+_full_export_lock = threading.Lock()
+_full_export_stats = CacheStats()
+
+
+def _full_export() -> str:
+    """
+    Выгрузить ccu и errors в файлы DATA_DIR и вернуть метку времени для /download.
+    Повторные запросы получают уже готовые файлы, пока данные не изменились и не истек EXPORT_CACHE_TTL.
+    
+    Raises:
+        TimeoutError: выгрузка в другом потоке не завершилась за EXPORT_WAIT_TIMEOUT секунд
+    """
+    with get_db(readonly=True) as db:
+        version = db.get_export_version()
+    
+    while True:
+        with _full_export_lock:
+            done = _full_export_cache.get('done')
+            if (done and done['version'] == version
+                    and time.time() - done['created_at'] < config.EXPORT_CACHE_TTL
+                    and (config.DATA_DIR / f"ccu_export_{done['timestamp']}.csv").exists()):
+                _full_export_stats.incr('hits')
+                return done['timestamp']
+            
+            pending = _full_export_cache.get('pending')
+            if pending is None:
+                pending = _full_export_cache['pending'] = threading.Event()
+                _full_export_stats.incr('misses')
+                if done:
+                    _full_export_stats.incr('evictions')
+                break
+        
+        # Выгрузку уже делает другой запрос - ждем ее и проверяем результат заново
+        _full_export_stats.incr('waits')
+        if not pending.wait(config.EXPORT_WAIT_TIMEOUT):
+            raise TimeoutError('Full export is still running, try again later')
+    
+    try:
+        timestamp = _export_timestamp()
+        ccu_file = config.DATA_DIR / f"ccu_export_{timestamp}.csv"
+        errors_file = config.DATA_DIR / f"errors_export_{timestamp}.csv"
+        
+        # Оба запроса выполняются параллельно, каждый на своем подключении из пула
+        futures = [
+            _export_executor.submit(_export_file, export_to_csv, ccu_file),
+            _export_executor.submit(_export_file, export_errors_to_csv, errors_file)
+        ]
+        for future in futures:
+            future.result()
+        
+        with _full_export_lock:
+            _full_export_cache['done'] = {'timestamp': timestamp, 'version': version, 'created_at': time.time()}
+        _prune_full_exports()
+        return timestamp
+    finally:
+        with _full_export_lock:
+            _full_export_cache.pop('pending', None)
+        pending.set()
+
+
+# Файлы полного экспорта с меткой времени (и их .gz-копии)
+_FULL_EXPORT_FILE = re.compile(r'(?:ccu|errors)_export_(\d{8}_\d{6}(?:_[0-9a-f]{8})?)\.csv(?:\.gz)?').fullmatch
+
+
+def _prune_full_exports():
+    """Удалить старые файлы полного экспорта, оставив EXPORT_KEEP_COUNT последних выгрузок"""
+    files = {}
+    for path in config.DATA_DIR.iterdir():
+        match = _FULL_EXPORT_FILE(path.name)
+        if match:
+            files.setdefault(match.group(1), []).append(path)
+    
+    # Метки YYYYMMDD_HHMMSS (с суффиксом или без) сортируются как строки
+    for timestamp in sorted(files, reverse=True)[max(config.EXPORT_KEEP_COUNT, 1):]:
+        for path in files[timestamp]:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not delete old export {path}: {e}")
+            else:
+                logger.info(f"Deleted old export {path.name}")
+
+
+def cache_stats():
+    """
+    Статистика кэшей в памяти процесса (для подбора TTL).
+    Маршрут /admin/cache-stats регистрируется только при CACHE_STATS_ENDPOINT=1
+    """
+    return jsonify({
+        'status_cache': {**_status_cache_stats['steamcharts'].snapshot(), 'ttl': config.STATUS_CACHE_TTL},
+        'itad_status_cache': {**_status_cache_stats['itad'].snapshot(), 'ttl': config.STATUS_CACHE_TTL},
+        'steam_status_cache': {**_status_cache_stats['steam'].snapshot(), 'ttl': config.STATUS_CACHE_TTL},
+        'export_cache': {**_full_export_stats.snapshot(), 'ttl': config.EXPORT_CACHE_TTL},
+        'log_lines_cache': _log_lines_stats.snapshot()
+    }), 200
+
+
+if config.CACHE_STATS_ENDPOINT:
+    app.add_url_rule('/admin/cache-stats', view_func=cache_stats, methods=['GET'])
+
+
 @app.route('/download/<file_type>', methods=['GET'])
 def download_file(file_type):
     """Скачивание экспортированных файлов"""
@@ -323,13 +951,72 @@ def download_file(file_type):
     if not filepath.exists():
         return jsonify({'error': 'File not found'}), 404
     
-    return send_file(str(filepath), as_attachment=True, download_name=filename)
+    # Файлы с меткой времени не меняются после создания - клиент может их кэшировать
+    return _send_export_file(filepath, filename, max_age=EXPORT_FILE_MAX_AGE if timestamp else None)
+
+
+def _send_export_file(filepath: Path, filename: str, max_age: int = None):
+    """
+    Отдать файл из DATA_DIR.
+    За nginx (USE_XSENDFILE=1) возвращаем только X-Accel-Redirect - файл отправляет nginx через sendfile,
+    рабочий поток сразу освобождается. Для Apache заголовок X-Sendfile выставляет сам send_file.
+    """
+    if config.USE_XSENDFILE and config.XSENDFILE_SERVER == 'nginx':
+        return Response('', headers={
+            'X-Accel-Redirect': f"{config.XACCEL_REDIRECT_PREFIX.rstrip('/')}/{filename}",
+            'Content-Type': 'text/csv',
+            'Content-Disposition': f'attachment; filename={filename}'
+        })
+    # Готовая gzip-копия (см. _precompress_file) - если клиент принимает gzip
+    gz_path = filepath.with_name(filepath.name + '.gz')
+    encoding = None
+    if request.accept_encodings['gzip'] and gz_path.exists():
+        filepath, encoding = gz_path, 'gzip'
+    
+    # conditional: ETag + Last-Modified, повторный запрос с If-None-Match/If-Modified-Since получает 304 без тела
+    response = send_file(
+        str(filepath),
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=filename,
+        conditional=True,
+        etag=True,
+        last_modified=filepath.stat().st_mtime,
+        max_age=max_age
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _export_file(export_func, path: Path):
+    """Записать один файл полного экспорта (на отдельном подключении из пула) и его gzip-копию"""
+    with get_db() as db:
+        export_func(db, path)
+    if config.PRECOMPRESS_EXPORTS and path.exists():
+        _precompress_file(path)
+
+
+def _precompress_file(path: Path) -> Path:
+    """
+    Записать рядом gzip-копию файла (<file>.gz) один раз при экспорте,
+    чтобы скачивания не сжимали данные на каждый запрос
+    """
+    gz_path = path.with_name(path.name + '.gz')
+    tmp_path = gz_path.with_name(gz_path.name + '.tmp')
+    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=config.EXPORT_GZIP_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, UPLOAD_COPY_BUFFER)
+    os.replace(tmp_path, gz_path)
+    return gz_path
 
 
 @app.route('/logs', methods=['GET'])
 def get_logs():
     """Получить последние логи парсера"""
     lines = request.args.get('lines', 100, type=int)
+    # count=false - только хвост, без подсчета total_lines (первый подсчет читает весь файл)
+    count_total = request.args.get('count', 'true').lower() != 'false'
     
     log_file = config.LOG_FILE
     if not log_file.exists():
@@ -339,163 +1026,194 @@ def get_logs():
         }), 200
     
     try:
-        with open(log_file, 'r') as f:
-            all_lines = f.readlines()
-            recent_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
+        recent_lines, total_lines = _tail_lines(log_file, lines, count_total)
         
-        return jsonify({
+        body = {
             'logs': [line.strip() for line in recent_lines],
-            'total_lines': len(all_lines)
-        }), 200
+            'size_bytes': log_file.stat().st_size
+        }
+        if count_total:
+            body['total_lines'] = total_lines
+        return jsonify(body), 200
     except Exception as e:
         return jsonify({
             'error': str(e)
         }), 500
 
 
-def run_itad_parser_in_thread(app_ids_file: Path):
-    """Запуск ITAD парсера в отдельном потоке"""
-    global itad_parser_instance, itad_parser_running
+# Сколько переводов строк в начале лог-файла уже посчитано:
+# {'key': (st_dev, st_ino), 'offset', 'newlines', 'mark': последние байты перед offset}.
+# Лог только дописывается, поэтому total_lines досчитывается по новым байтам, а не по всему файлу
+LOG_LINES_MARK = 64
+_log_lines_cache = {}
+_log_lines_cache_lock = threading.Lock()
+_log_lines_stats = CacheStats()
+
+
+def _tail_lines(path: Path, count: int, count_total: bool = True):
+    """
+    Последние count строк файла (как tail -n): читаем с конца блоками по 64 KB,
+    пока не наберется достаточно переводов строк. Память - O(count), а не O(размер файла).
+    
+    Returns:
+        (список строк, общее число строк в файле или None при count_total=False)
+    """
+    buf = bytearray()
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        pos = size
+        newlines = 0
+        last_byte = b''
+        # Читаем с конца, пока не найдем count+1 переводов строки (с учетом незавершенной последней строки)
+        while pos > 0 and newlines <= count:
+            chunk = min(LOG_READ_BLOCK, pos)
+            pos -= chunk
+            f.seek(pos)
+            block = f.read(chunk)
+            if not last_byte:
+                last_byte = block[-1:]
+            newlines += block.count(b'\n')
+            buf[:0] = block
+        
+        total = _count_log_lines(f, stat, pos, buf, newlines, last_byte) if count_total else None
+    
+    if count <= 0:
+        return [], total
+    recent = buf.decode('utf-8', errors='replace').splitlines()
+    return recent[-count:], total
+
+
+def _count_log_lines(f, stat, pos: int, buf: bytearray, newlines: int, last_byte: bytes) -> int:
+    """
+    Общее число строк открытого лог-файла f, у которого _tail_lines уже прочитал
+    хвост buf с позиции pos (newlines переводов строк в нем).
+    """
+    size = stat.st_size
+    # Общее число строк: берем посчитанное в прошлый раз начало файла (если файл не подменили
+    # и не обрезали - сверяем байты перед сохраненной позицией) и досчитываем только то,
+    # что не попало ни в кэш, ни в прочитанный хвост
+    key = (stat.st_dev, stat.st_ino)
+    with _log_lines_cache_lock:
+        cached = dict(_log_lines_cache)
+    offset, total = 0, 0
+    if cached.get('key') == key and cached['offset'] <= size:
+        mark = cached['mark']
+        f.seek(cached['offset'] - len(mark))
+        if f.read(len(mark)) == mark:
+            offset, total = cached['offset'], cached['newlines']
+    if offset:
+        _log_lines_stats.incr('hits')
+    else:
+        _log_lines_stats.incr('misses')
+        if cached:
+            _log_lines_stats.incr('evictions')
+    
+    if offset >= pos:
+        total += buf.count(b'\n', offset - pos)
+    else:
+        total += newlines
+        f.seek(offset)
+        remaining = pos - offset
+        while remaining > 0:
+            block = f.read(min(LOG_READ_BLOCK, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            total += block.count(b'\n')
+    
+    mark_size = min(LOG_LINES_MARK, size)
+    f.seek(size - mark_size)
+    with _log_lines_cache_lock:
+        _log_lines_cache.update(key=key, offset=size, newlines=total, mark=f.read(mark_size))
+    
+    if size and last_byte != b'\n':
+        total += 1  # последняя строка без перевода строки
+    return total
+
+
+def run_itad_parser_in_thread(app_ids_file: Path, stop_event: threading.Event):
+    """Запуск ITAD парсера в рабочем потоке"""
     
     try:
-        itad_parser_running = True
         logger.info(f"Starting ITAD parser with app_ids file: {app_ids_file}")
         
-        # Копируем файл в стандартное место (если это разные файлы)
-        import shutil
-        import os
-        source_path = str(app_ids_file) if isinstance(app_ids_file, Path) else app_ids_file
-        dest_path = str(config.APP_IDS_FILE) if isinstance(config.APP_IDS_FILE, Path) else config.APP_IDS_FILE
-        
-        # Проверяем, не являются ли это одним и тем же файлом
-        source_normalized = os.path.normpath(os.path.abspath(source_path))
-        dest_normalized = os.path.normpath(os.path.abspath(dest_path))
-        
-        if source_normalized == dest_normalized:
-            logger.info(f"Source and destination are the same file ({source_normalized}), skipping copy")
-        else:
-            logger.info(f"Copying file from {source_path} to {dest_path}")
-            shutil.copy2(source_path, dest_path)
-            logger.info(f"File copied successfully")
-        
         logger.info(f"Creating ITADParserMain instance")
-        itad_parser_instance = ITADParserMain(app_ids_file=Path(dest_path))
+        _itad_parser.instance = ITADParserMain(app_ids_file=app_ids_file, stop_event=stop_event)
         
         logger.info(f"Starting parser.run()")
-        itad_parser_instance.run()
+        _itad_parser.instance.run()
         
         logger.info("ITAD parser completed successfully")
     except Exception as e:
         logger.error(f"ITAD parser error: {e}", exc_info=True)
-        import traceback
         logger.error(f"Traceback: {traceback.format_exc()}")
     finally:
-        logger.info("Setting itad_parser_running = False")
-        itad_parser_running = False
-        itad_parser_instance = None
+        _itad_parser.instance = None
 
 
 def run_steam_parser_in_thread():
-    """Запуск Steam парсера в отдельном потоке"""
-    global steam_parser_instance, steam_parser_running
+    """Запуск Steam парсера в рабочем потоке"""
     
     try:
-        steam_parser_running = True
         logger.info("Starting Steam price parser")
         
         logger.info("Creating SteamParserMain instance")
-        steam_parser_instance = SteamParserMain()
+        _steam_parser.instance = SteamParserMain()
         
         logger.info("Starting parser.run()")
-        steam_parser_instance.run()
+        _steam_parser.instance.run()
         
         logger.info("Steam parser completed successfully")
     except Exception as e:
         logger.error(f"Steam parser error: {e}", exc_info=True)
-        import traceback
         traceback.print_exc()
     finally:
-        steam_parser_running = False
-        steam_parser_instance = None
+        _steam_parser.instance = None
         logger.info("Steam parser thread finished")
 
 
 @app.route('/itad/start', methods=['POST'])
 def start_itad_parser():
     """Запуск ITAD парсера с файлом app_ids"""
-    global itad_parser_thread, itad_parser_running
-    
-    if itad_parser_running:
+    if _itad_parser.running():
         return jsonify({
             'error': 'ITAD parser is already running',
             'status': 'running'
         }), 400
     
-    # Проверяем наличие файла в запросе или используем существующий
-    upload_folder = Path(app.config['UPLOAD_FOLDER'])
-    filepath = None
-    filename = 'app_ids.txt'
-    
-    if 'file' in request.files and request.files['file'].filename:
-        # Файл загружен в запросе
-        file = request.files['file']
-        file_filename = file.filename if file.filename else 'app_ids.txt'
-        if not isinstance(file_filename, str):
-            file_filename = str(file_filename)
-        filename = secure_filename(file_filename)
-        filepath = upload_folder / filename
-        file.save(str(filepath))
-        logger.info(f"Received app_ids file for ITAD parser: {filename}, saved to {filepath}")
-    else:
-        # Используем существующий файл из стандартного места
-        default_filepath = Path(config.APP_IDS_FILE)
-        if default_filepath.exists():
-            filepath = default_filepath
-            filename = default_filepath.name
-            logger.info(f"Using existing app_ids file: {filepath}")
-        else:
-            return jsonify({
-                'error': 'No file provided and no existing app_ids.txt found. Please upload app_ids.txt file'
-            }), 400
-    
-    # Проверяем формат файла
+    # Файл из запроса (проверяется и сохраняется в стандартное место) или уже существующий
     try:
-        with open(filepath, 'r') as f:
-            lines = [line.strip() for line in f if line.strip()]
-            if not lines:
-                return jsonify({
-                    'error': 'File is empty'
-                }), 400
-            
-            # Проверяем, что это числа
-            try:
-                app_ids = [int(line) for line in lines if line.isdigit()]
-                if not app_ids:
-                    return jsonify({
-                        'error': 'No valid app IDs found in file'
-                    }), 400
-            except ValueError:
+        if 'file' in request.files and request.files['file'].filename:
+            filename, filepath, app_ids_count = _accept_upload(request.files['file'], 'ITAD')
+        else:
+            filepath = Path(config.APP_IDS_FILE)
+            if not filepath.exists():
                 return jsonify({
-                    'error': 'Invalid file format. Expected one app ID per line'
+                    'error': 'No file provided and no existing app_ids.txt found. Please upload app_ids.txt file'
                 }), 400
-        
-        logger.info(f"File validated: {len(app_ids)} app IDs found")
-    except Exception as e:
+            filename = filepath.name
+            logger.info(f"Using existing app_ids file: {filepath}")
+            with open(filepath, 'rb') as f:
+                app_ids_count = _validate_app_ids(f)
+    except ValueError as e:
         return jsonify({
-            'error': f'Error reading file: {str(e)}'
+            'error': str(e)
         }), 400
+    logger.info(f"File validated: {app_ids_count} app IDs found")
     
-    # Запускаем ITAD парсер в отдельном потоке
-    itad_parser_thread = threading.Thread(
-        target=run_itad_parser_in_thread,
-        args=(filepath,),
-        daemon=True
-    )
-    itad_parser_thread.start()
+    # Запускаем ITAD парсер в рабочем потоке (повторная проверка под блокировкой - против двойного старта)
+    stop_event = threading.Event()
+    if _itad_parser.start(run_itad_parser_in_thread, filepath, stop_event, stop_event=stop_event) is None:
+        return jsonify({
+            'error': 'ITAD parser is already running',
+            'status': 'running'
+        }), 400
+    _invalidate_status_cache()
     
     return jsonify({
         'status': 'started',
-        'message': f'ITAD parser started with {len(app_ids)} app IDs',
+        'message': f'ITAD parser started with {app_ids_count} app IDs',
         'file': filename
     }), 200
 
@@ -504,135 +1222,56 @@ def start_itad_parser():
 def itad_status():
     """Получить статус ITAD парсинга"""
     try:
-        # Получаем статистику из БД
-        from database import Database
-        db = Database()
-        try:
-            stats = db.get_statistics()
-            
-            # Получаем ITAD-специфичную статистику
-            cursor = db._get_cursor()
-            conn = db.get_connection()
-            
-            # Пробуем получить статистику с ITAD колонками, если ошибка - используем базовую
-            try:
-                if db.use_postgresql:
-                    cursor.execute("""
-                        SELECT 
-                            COUNT(*) FILTER (WHERE status = 'itad_completed') as completed,
-                            COUNT(*) FILTER (WHERE status = 'itad_processing') as processing,
-                            COUNT(*) FILTER (WHERE status = 'itad_error') as errors,
-                            COALESCE(SUM(itad_price_processed), 0) as total_price_records
-                        FROM app_status
-                    """)
-                else:
-                    cursor.execute("""
-                        SELECT 
-                            SUM(CASE WHEN status = 'itad_completed' THEN 1 ELSE 0 END) as completed,
-                            SUM(CASE WHEN status = 'itad_processing' THEN 1 ELSE 0 END) as processing,
-                            SUM(CASE WHEN status = 'itad_error' THEN 1 ELSE 0 END) as errors,
-                            COALESCE(SUM(itad_price_processed), 0) as total_price_records
-                        FROM app_status
-                    """)
-                row = cursor.fetchone()
-            except Exception as e:
-                # Если колонок нет или ошибка, откатываем транзакцию и используем базовую статистику
-                if db.use_postgresql:
-                    conn.rollback()
-                    cursor.execute("""
-                        SELECT 
-                            COUNT(*) FILTER (WHERE status = 'itad_completed') as completed,
-                            COUNT(*) FILTER (WHERE status = 'itad_processing') as processing,
-                            COUNT(*) FILTER (WHERE status = 'itad_error') as errors,
-                            0 as total_price_records
-                        FROM app_status
-                    """)
-                else:
-                    cursor.execute("""
-                        SELECT 
-                            SUM(CASE WHEN status = 'itad_completed' THEN 1 ELSE 0 END) as completed,
-                            SUM(CASE WHEN status = 'itad_processing' THEN 1 ELSE 0 END) as processing,
-                            SUM(CASE WHEN status = 'itad_error' THEN 1 ELSE 0 END) as errors,
-                            0 as total_price_records
-                        FROM app_status
-                    """)
-                row = cursor.fetchone()
-            
-            # Обрабатываем результат
-            if db.use_postgresql and hasattr(row, '__getitem__'):
-                if isinstance(row, dict):
-                    itad_stats = {
-                        'completed': row.get('completed', 0) or 0,
-                        'processing': row.get('processing', 0) or 0,
-                        'errors': row.get('errors', 0) or 0,
-                        'total_price_records': row.get('total_price_records', 0) or 0
-                    }
-                else:
-                    itad_stats = {
-                        'completed': row[0] or 0,
-                        'processing': row[1] or 0,
-                        'errors': row[2] or 0,
-                        'total_price_records': row[3] or 0
-                    }
-            else:
-                itad_stats = {
-                    'completed': row[0] or 0 if row else 0,
-                    'processing': row[1] or 0 if row else 0,
-                    'errors': row[2] or 0 if row else 0,
-                    'total_price_records': row[3] or 0 if row else 0
-                }
-            
-        finally:
-            db.close()
-        
-        total = stats.get('total', 0)
-        completed = itad_stats['completed']
-        errors_count = itad_stats['errors']
-        
-        progress_percent = 0.0
-        if total > 0:
-            progress_percent = round((completed + errors_count) / total * 100, 2)
-        
-        return jsonify({
-            'parser_running': itad_parser_running,
-            'statistics': {
-                'total_apps': total,
-                'completed': completed,
-                'processing': itad_stats['processing'],
-                'pending': stats.get('pending', 0),
-                'errors': errors_count,
-                'price_records': itad_stats['total_price_records']
-            },
-            'progress_percent': progress_percent
-        }), 200
+        return _status_response(_cached_status_body('itad', _itad_parser.running(), _build_itad_status_body))
     except Exception as e:
         logger.error(f"Error getting ITAD status: {e}", exc_info=True)
         return jsonify({
             'error': str(e),
-            'parser_running': itad_parser_running
+            'parser_running': _itad_parser.running()
         }), 500
 
 
+def _build_itad_status_body(running: bool) -> str:
+    """Собрать тело ответа /itad/status"""
+    # Общие и ITAD-счетчики одним запросом к app_status
+    with get_db(readonly=True) as db:
+        itad_stats = db.get_itad_statistics()
+    
+    total = itad_stats['total']
+    completed = itad_stats['completed']
+    errors_count = itad_stats['errors']
+    
+    progress_percent = 0.0
+    if total > 0:
+        progress_percent = round((completed + errors_count) / total * 100, 2)
+    
+    return app.json.dumps({
+        'parser_running': running,
+        'statistics': {
+            'total_apps': total,
+            'completed': completed,
+            'processing': itad_stats['processing'],
+            'pending': itad_stats['pending'],
+            'errors': errors_count,
+            'price_records': itad_stats['total_price_records']
+        },
+        'progress_percent': progress_percent
+    }) + "\n"
+
+
 @app.route('/itad/stop', methods=['POST'])
 def stop_itad_parser():
     """Остановка ITAD парсера"""
-    global itad_parser_instance, itad_parser_running
-    
-    if not itad_parser_running:
+    if not _itad_parser.running():
         return jsonify({
             'status': 'not_running',
             'message': 'ITAD parser is not running'
         }), 200
     
     try:
-        if itad_parser_instance:
-            itad_parser_instance.running = False
-            # Safely stop parser if it exists
-            if hasattr(itad_parser_instance, 'parser'):
-                itad_parser_instance.parser.running = False
-            logger.info("Stopping ITAD parser...")
-        
-        itad_parser_running = False
+        _stop_itad_parser()
+        logger.info("Stopping ITAD parser...")
+        _invalidate_status_cache()
         
         return jsonify({
             'status': 'stopping',
@@ -645,103 +1284,68 @@ def stop_itad_parser():
         }), 500
 
 
+# Количество записей и размер ccu_history одним запросом (до и после очистки)
+CCU_HISTORY_SIZE_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM ccu_history) AS row_count,
+        pg_size_pretty(pg_total_relation_size('ccu_history')) AS total_size,
+        pg_size_pretty(pg_relation_size('ccu_history')) AS table_size
+"""
+
+
 @app.route('/database/clear/ccu_history', methods=['POST'])
 def clear_ccu_history():
-    """Очистить таблицу ccu_history - прямое подключение для надежности"""
+    """Очистить таблицу ccu_history (подключение из общего пула)"""
     try:
-        import psycopg2
-        import urllib.parse as urlparse
-        import os
-        
-        # Получаем URL базы данных
-        database_url = os.getenv("DATABASE_URL") or os.getenv("DATABASE_PUBLIC_URL")
-        if not database_url:
-            return jsonify({
-                'status': 'error',
-                'error': 'DATABASE_URL not found'
-            }), 500
-        
-        # Парсим URL и подключаемся напрямую
-        result = urlparse.urlparse(database_url)
-        conn = None
-        
-        try:
-            conn = psycopg2.connect(
-                database=result.path[1:],
-                user=result.username,
-                password=result.password,
-                host=result.hostname,
-                port=result.port or 5432,
-                connect_timeout=30
-            )
-            conn.autocommit = False
-            cursor = conn.cursor()
-            
-            # Получаем размер и количество записей перед очисткой
-            cursor.execute("SELECT COUNT(*) FROM ccu_history")
-            row_count_before = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT 
-                    pg_size_pretty(pg_total_relation_size('ccu_history')) as total_size,
-                    pg_size_pretty(pg_relation_size('ccu_history')) as table_size
-            """)
-            size_before = cursor.fetchone()
-            
-            # Очищаем таблицу (TRUNCATE быстрее и сразу освобождает место)
-            logger.info(f"Clearing ccu_history table ({row_count_before:,} records)")
-            cursor.execute("TRUNCATE TABLE ccu_history RESTART IDENTITY CASCADE")
-            conn.commit()
-            
-            # Проверяем результат
-            cursor.execute("SELECT COUNT(*) FROM ccu_history")
-            row_count_after = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                SELECT 
-                    pg_size_pretty(pg_total_relation_size('ccu_history')) as total_size,
-                    pg_size_pretty(pg_relation_size('ccu_history')) as table_size
-            """)
-            size_after = cursor.fetchone()
-            
-            cursor.close()
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'ccu_history table cleared successfully',
-                'row_count_before': row_count_before,
-                'row_count_after': row_count_after,
-                'size_before': {
-                    'total': size_before[0],
-                    'table': size_before[1]
-                },
-                'size_after': {
-                    'total': size_after[0],
-                    'table': size_after[1]
-                }
-            }), 200
+        with get_db() as db:
+            if not db.use_postgresql:
+                return jsonify({
+                    'status': 'error',
+                    'error': 'Clearing ccu_history is supported only for PostgreSQL'
+                }), 400
             
-        except psycopg2.OperationalError as e:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            try:
+                # Получаем размер и количество записей перед очисткой
+                cursor.execute(CCU_HISTORY_SIZE_QUERY)
+                row_count_before, *size_before = cursor.fetchone()
+                
+                # Очищаем таблицу (TRUNCATE быстрее и сразу освобождает место)
+                logger.info(f"Clearing ccu_history table ({row_count_before:,} records)")
+                cursor.execute("TRUNCATE TABLE ccu_history RESTART IDENTITY CASCADE")
+                conn.commit()
+                
+                # Проверяем результат
+                cursor.execute(CCU_HISTORY_SIZE_QUERY)
+                row_count_after, *size_after = cursor.fetchone()
+            finally:
+                cursor.close()
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'ccu_history table cleared successfully',
+            'row_count_before': row_count_before,
+            'row_count_after': row_count_after,
+            'size_before': {
+                'total': size_before[0],
+                'table': size_before[1]
+            },
+            'size_after': {
+                'total': size_after[0],
+                'table': size_after[1]
+            }
+        }), 200
+    
+    except Exception as e:
+        if POSTGRESQL_AVAILABLE and isinstance(e, psycopg2.OperationalError):
             logger.error(f"Database connection error: {e}")
             return jsonify({
                 'status': 'error',
                 'error': f'Database connection failed: {str(e)}',
                 'hint': 'Database may be starting up or disk is full. Try again in a few minutes.'
             }), 503
-        except Exception as e:
-            logger.error(f"Error clearing ccu_history: {e}", exc_info=True)
-            if conn:
-                conn.rollback()
-            return jsonify({
-                'status': 'error',
-                'error': str(e)
-            }), 500
-        finally:
-            if conn:
-                conn.close()
-                
-    except Exception as e:
-        logger.error(f"Error in clear_ccu_history endpoint: {e}", exc_info=True)
+        logger.error(f"Error clearing ccu_history: {e}", exc_info=True)
         return jsonify({
             'status': 'error',
             'error': str(e)
@@ -751,71 +1355,37 @@ def clear_ccu_history():
 @app.route('/itad/retry-errors', methods=['POST'])
 def retry_itad_errors():
     """Сбросить статус ошибок и запустить повторную обработку App ID с ошибками"""
-    global itad_parser_thread, itad_parser_running
-    
-    if itad_parser_running:
+    if _itad_parser.running():
         return jsonify({
             'error': 'ITAD parser is already running',
             'status': 'running'
         }), 400
     
     try:
-        from database import Database
-        db = Database()
-        
-        try:
+        with get_db() as db:
             cursor = db._get_cursor()
             
-            # Получаем количество App ID с ошибками
-            if db.use_postgresql:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM app_status 
-                    WHERE status = 'itad_error'
-                """)
-            else:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM app_status 
-                    WHERE status = 'itad_error'
-                """)
-            
-            row = cursor.fetchone()
-            if db.use_postgresql and isinstance(row, dict):
-                error_count = row.get('count', 0) or 0
-            else:
-                error_count = row[0] if row else 0
+            # Сбрасываем статус ошибок на 'pending' для повторной обработки одним UPDATE:
+            # количество сброшенных App ID берем из rowcount, без отдельного COUNT(*)
+            # При этом существующие данные в price_history сохранятся благодаря ON CONFLICT DO NOTHING
+            cursor.execute("""
+                UPDATE app_status 
+                SET status = 'pending', 
+                    itad_error = NULL,
+                    itad_price_processed = 0,
+                    itad_currencies_checked = NULL
+                WHERE status = 'itad_error'
+            """)
+            error_count = cursor.rowcount
             
-            if error_count == 0:
+            if error_count <= 0:
                 return jsonify({
                     'status': 'no_errors',
                     'message': 'No App IDs with errors found'
                 }), 200
             
-            # Сбрасываем статус ошибок на 'pending' для повторной обработки
-            # При этом существующие данные в price_history сохранятся благодаря ON CONFLICT DO NOTHING
-            if db.use_postgresql:
-                cursor.execute("""
-                    UPDATE app_status 
-                    SET status = 'pending', 
-                        itad_error = NULL,
-                        itad_price_processed = 0,
-                        itad_currencies_checked = NULL
-                    WHERE status = 'itad_error'
-                """)
-            else:
-                cursor.execute("""
-                    UPDATE app_status 
-                    SET status = 'pending', 
-                        itad_error = NULL,
-                        itad_price_processed = 0,
-                        itad_currencies_checked = NULL
-                    WHERE status = 'itad_error'
-                """)
-            
             db.get_connection().commit()
             logger.info(f"Reset status for {error_count} App IDs with errors")
-            
-        finally:
-            db.close()
         
         # Используем существующий файл app_ids.txt
         default_filepath = Path(config.APP_IDS_FILE)
@@ -824,13 +1394,14 @@ def retry_itad_errors():
                 'error': 'app_ids.txt file not found. Please upload it first.'
             }), 400
         
-        # Запускаем ITAD парсер в отдельном потоке
-        itad_parser_thread = threading.Thread(
-            target=run_itad_parser_in_thread,
-            args=(default_filepath,),
-            daemon=True
-        )
-        itad_parser_thread.start()
+        # Запускаем ITAD парсер в рабочем потоке (повторная проверка под блокировкой - против двойного старта)
+        stop_event = threading.Event()
+        if _itad_parser.start(run_itad_parser_in_thread, default_filepath, stop_event, stop_event=stop_event) is None:
+            return jsonify({
+                'error': 'ITAD parser is already running',
+                'status': 'running'
+            }), 400
+        _invalidate_status_cache()
         
         return jsonify({
             'status': 'started',
@@ -847,52 +1418,17 @@ def retry_itad_errors():
 
 @app.route('/itad/export', methods=['GET'])
 def export_itad_data():
-    """Экспорт ITAD результатов в CSV"""
+    """Экспорт ITAD результатов в CSV (потоком с серверного курсора, без временного файла)"""
     try:
-        from database import Database
-        from pathlib import Path
-        from datetime import datetime
-        import csv
-        
-        db = Database()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = config.DATA_DIR / f"itad_price_history_export_{timestamp}.csv"
-        
-        try:
-            cursor = db._get_cursor()
-            
-            # Export price_history data
-            if db.use_postgresql:
-                cursor.execute("""
-                    SELECT app_id, datetime, price_final, currency_symbol, currency_name
-                    FROM price_history
-                    ORDER BY app_id, datetime
-                """)
-            else:
-                cursor.execute("""
-                    SELECT app_id, datetime, price_final, currency_symbol, currency_name
-                    FROM price_history
-                    ORDER BY app_id, datetime
-                """)
-            
-            rows = cursor.fetchall()
-            
-            # Write to CSV
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['app_id', 'datetime', 'price_final', 'currency_symbol', 'currency_name'])
-                writer.writerows(rows)
-            
-            logger.info(f"Exported {len(rows)} ITAD price records to {output_file}")
-            
-            if not output_file.exists():
-                return jsonify({'error': 'Export file not created'}), 500
-            
-            return send_file(str(output_file), as_attachment=True, download_name=f"itad_price_history_{timestamp}.csv")
-            
-        finally:
-            db.close()
-            
+        timestamp = _export_timestamp()
+        # Заголовок CSV выдается всегда, поэтому ответ не бывает пустым
+        return _stream_csv(_iter_itad_csv, f"itad_price_history_{timestamp}.csv")
+    
+    except TimeoutError as e:
+        return jsonify({
+            'status': 'in_progress',
+            'error': str(e)
+        }), 503
     except Exception as e:
         logger.error(f"Error exporting ITAD data: {e}", exc_info=True)
         return jsonify({
@@ -900,12 +1436,123 @@ def export_itad_data():
         }), 500
 
 
+ITAD_CSV_HEADER = ['app_id', 'datetime', 'price_final', 'currency_symbol', 'currency_name']
+
+ITAD_EXPORT_QUERY = """
+    SELECT app_id, datetime, price_final, currency_symbol, currency_name
+    FROM price_history
+    ORDER BY app_id, datetime
+"""
+
+
+# Порции COPY копятся до этого размера перед передачей в ответ (psycopg2 пишет по строке)
+COPY_CHUNK_SIZE = 64 * 1024
+# Сколько готовых порций может ждать медленного клиента, прежде чем COPY встанет на паузу
+COPY_QUEUE_SIZE = 16
+
+
+def _iter_copy_csv(db, query: str):
+    """
+    Выдавать CSV, который формирует сам PostgreSQL (COPY ... TO STDOUT WITH CSV HEADER):
+    без кортежей на каждую строку и без csv.writer в Python.
+    
+    copy_expert пишет в файл синхронно до конца выборки, поэтому выполняется в отдельном
+    потоке, а порции передаются генератору через ограниченную очередь. При закрытии
+    генератора (клиент отключился) COPY прерывается, и поток завершается до того,
+    как подключение вернется в пул.
+    """
+    chunks = queue.Queue(maxsize=COPY_QUEUE_SIZE)
+    cancelled = threading.Event()
+    finished = object()
+    
+    def put(item) -> bool:
+        while not cancelled.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    class ChunkWriter:
+        def __init__(self):
+            self.buffer = bytearray()
+        
+        def write(self, data):
+            self.buffer += data
+            if len(self.buffer) >= COPY_CHUNK_SIZE:
+                if not put(bytes(self.buffer)):
+                    raise RuntimeError("CSV export cancelled")
+                self.buffer.clear()
+    
+    def produce():
+        writer = ChunkWriter()
+        cursor = db.get_connection().cursor()
+        try:
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", writer)
+            if writer.buffer:
+                put(bytes(writer.buffer))
+            put(finished)
+        except Exception as e:
+            put(e)
+        finally:
+            cursor.close()
+    
+    thread = threading.Thread(target=produce, name='csv-copy', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
+
+
+def _iter_itad_csv(db, batch_size: int = None):
+    """
+    Выдавать price_history порциями CSV: сначала заголовок, затем по порции на пачку строк.
+    В PostgreSQL CSV формирует сервер через COPY, в SQLite - csv.writer по ленивому курсору
+    """
+    if db.use_postgresql:
+        yield from _iter_copy_csv(db, ITAD_EXPORT_QUERY)
+        return
+    
+    batch_size = batch_size or config.EXPORT_BATCH_SIZE
+    cursor = db.get_connection().cursor()
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ITAD_CSV_HEADER)
+    
+    try:
+        cursor.execute(ITAD_EXPORT_QUERY)
+        yield buffer.getvalue()
+        
+        written_rows = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            written_rows += len(rows)
+            yield buffer.getvalue()
+        
+        logger.info(f"Exported {written_rows} ITAD price records")
+    finally:
+        cursor.close()
+
+
 @app.route('/steam/start', methods=['POST'])
 def start_steam_parser():
     """Запуск Steam парсера для App IDs с ошибками"""
-    global steam_parser_thread, steam_parser_running
-    
-    if steam_parser_running:
+    if _steam_parser.running():
         return jsonify({
             'error': 'Steam parser is already running',
             'status': 'running'
@@ -913,44 +1560,22 @@ def start_steam_parser():
     
     try:
         # Проверяем количество App IDs с ошибками
-        from database import Database
-        db = Database()
+        with get_db(readonly=True) as db:
+            error_count = db.get_itad_error_count()
         
-        try:
-            cursor = db._get_cursor()
-            
-            if db.use_postgresql:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM app_status 
-                    WHERE status = 'itad_error'
-                """)
-            else:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM app_status 
-                    WHERE status = 'itad_error'
-                """)
-            
-            row = cursor.fetchone()
-            if db.use_postgresql and isinstance(row, dict):
-                error_count = row.get('count', 0) or 0
-            else:
-                error_count = row[0] if row else 0
-            
-            if error_count == 0:
-                return jsonify({
-                    'status': 'no_errors',
-                    'message': 'No App IDs with errors found'
-                }), 200
-            
-        finally:
-            db.close()
+        if error_count == 0:
+            return jsonify({
+                'status': 'no_errors',
+                'message': 'No App IDs with errors found'
+            }), 200
         
-        # Запускаем Steam парсер в отдельном потоке
-        steam_parser_thread = threading.Thread(
-            target=run_steam_parser_in_thread,
-            daemon=True
-        )
-        steam_parser_thread.start()
+        # Запускаем Steam парсер в рабочем потоке (повторная проверка под блокировкой - против двойного старта)
+        if _steam_parser.start(run_steam_parser_in_thread) is None:
+            return jsonify({
+                'error': 'Steam parser is already running',
+                'status': 'running'
+            }), 400
+        _invalidate_status_cache()
         
         return jsonify({
             'status': 'started',
@@ -967,17 +1592,17 @@ def start_steam_parser():
 @app.route('/steam/stop', methods=['POST'])
 def stop_steam_parser():
     """Остановка Steam парсера"""
-    global steam_parser_instance, steam_parser_running
-    
-    if not steam_parser_running:
+    if not _steam_parser.running():
         return jsonify({
             'status': 'not_running',
             'message': 'Steam parser is not running'
         }), 200
     
     try:
-        if steam_parser_instance:
-            steam_parser_instance.stop()
+        instance = _steam_parser.instance
+        if instance:
+            instance.stop()
+        _invalidate_status_cache()
         
         return jsonify({
             'status': 'stopping',
@@ -994,52 +1619,30 @@ def stop_steam_parser():
 def steam_status():
     """Получить статус Steam парсинга"""
     try:
-        from database import Database
-        db = Database()
-        
-        try:
-            # Получаем количество App IDs с ошибками
-            cursor = db._get_cursor()
-            
-            if db.use_postgresql:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM app_status 
-                    WHERE status = 'itad_error'
-                """)
-            else:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM app_status 
-                    WHERE status = 'itad_error'
-                """)
-            
-            row = cursor.fetchone()
-            if db.use_postgresql and isinstance(row, dict):
-                error_count = row.get('count', 0) or 0
-            else:
-                error_count = row[0] if row else 0
-            
-            # Получаем общую статистику цен
-            stats = db.get_statistics()
-            
-        finally:
-            db.close()
-        
-        return jsonify({
-            'parser_running': steam_parser_running,
-            'statistics': {
-                'error_app_ids': error_count,
-                'total_price_records': stats.get('price_records', 0)
-            }
-        }), 200
-        
+        return _status_response(_cached_status_body('steam', _steam_parser.running(), _build_steam_status_body))
     except Exception as e:
         logger.error(f"Error getting Steam status: {e}", exc_info=True)
         return jsonify({
             'error': str(e),
-            'parser_running': steam_parser_running
+            'parser_running': _steam_parser.running()
         }), 500
 
 
+def _build_steam_status_body(running: bool) -> str:
+    """Собрать тело ответа /steam/status"""
+    # Количество App IDs с ошибками и записей цен - одним запросом
+    with get_db(readonly=True) as db:
+        stats = db.get_steam_statistics()
+    
+    return app.json.dumps({
+        'parser_running': running,
+        'statistics': {
+            'error_app_ids': stats['error_app_ids'],
+            'total_price_records': stats['price_records']
+        }
+    }) + "\n"
+
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     host = os.getenv('HOST', '0.0.0.0')
@@ -1047,5 +1650,18 @@ if __name__ == '__main__':
     logger.info(f"Starting API server on {host}:{port}")
     logger.info(f"Database: PostgreSQL={config.USE_POSTGRESQL}, URL={'set' if config.DATABASE_URL else 'not set'}")
     
-    # Flask development server (для production используется gunicorn через Procfile)
-    app.run(host=host, port=port, debug=False, threaded=True)
+    if os.getenv('FLASK_DEV') == '1':
+        # Flask development server - только для локальной отладки
+        warmup()
+        try:
+            app.run(host=host, port=port, debug=False, threaded=True)
+        finally:
+            shutdown_parsers()
+    else:
+        # Production: gunicorn (gthread) с настройками из gunicorn_config.py
+        os.execvp('gunicorn', [
+            'gunicorn',
+            '-c', str(config.BASE_DIR / 'gunicorn_config.py'),
+            '--bind', f'{host}:{port}',
+            'api_server:app'
+        ])
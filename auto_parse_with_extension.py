@@ -4,12 +4,31 @@
 Открывает батчи последовательно, расширение автоматически собирает данные
 """
 import asyncio
+from collections import deque
 from pathlib import Path
 from playwright.async_api import async_playwright
 
 EXTENSION_PATH = Path(__file__).parent / "browser_extension"
 APP_IDS_FILE = Path(__file__).parent / "app_ids.txt"
 BATCH_SIZE = 10  # Размер батча для Compare
+COMPARE_URL = "https://steamdb.info/charts/?compare="
+PARALLEL_PAGES = 3  # Вкладок, обрабатывающих батчи одновременно (больше - SteamDB начинает ограничивать)
+PREFETCH_DEPTH = 1  # Сколько следующих батчей каждая вкладка-воркер загружает заранее в дополнительных вкладках
+BATCH_TIMEOUT = 30  # Сколько ждать, пока расширение начнет скачивание CSV батча
+MAX_BACKOFF = 60  # Максимальная пауза между батчами после ответов 429/503
+
+# Расширение сообщает странице о начале скачивания CSV (или об ошибке) через window.postMessage.
+# Слушатель ставится до скриптов страницы: заранее загруженная вкладка может получить сигнал
+# раньше, чем до нее дойдет очередь
+CSV_LISTENER_JS = """window.__csvDownload = new Promise(resolve => {
+    window.addEventListener('message', event => {
+        const type = event.data && event.data.type;
+        if (type === 'CSV_DOWNLOAD_STARTED' || type === 'CSV_DOWNLOAD_ERROR') {
+            resolve(type);
+        }
+    });
+});"""
+WAIT_FOR_CSV_JS = "() => window.__csvDownload"
 
 def load_app_ids():
     """Load APP IDs from file"""
@@ -17,10 +36,19 @@ def load_app_ids():
         app_ids = [int(line.strip()) for line in f if line.strip() and line.strip().isdigit()]
     return app_ids
 
+def build_compare_urls(app_ids):
+    """Compare URL для каждого батча - строятся один раз до цикла обработки"""
+    ids = [str(app_id) for app_id in app_ids]
+    return [
+        COMPARE_URL + ','.join(ids[i:i + BATCH_SIZE])
+        for i in range(0, len(ids), BATCH_SIZE)
+    ]
+
 async def run_auto_parsing():
     """Автоматически открывает батчи для парсинга"""
     app_ids = load_app_ids()
-    total_batches = (len(app_ids) + BATCH_SIZE - 1) // BATCH_SIZE
+    compare_urls = build_compare_urls(app_ids)
+    total_batches = len(compare_urls)
     
     print(f"✅ Загружено {len(app_ids)} APP IDs")
     print(f"📊 Будет обработано {total_batches} батчей по {BATCH_SIZE} APP IDs")
@@ -49,32 +77,87 @@ async def run_auto_parsing():
         print("⏸️  Нажмите Ctrl+C для остановки\n")
         
         processed = 0
-        try:
-            for i in range(0, len(app_ids), BATCH_SIZE):
-                batch = app_ids[i:i + BATCH_SIZE]
-                batch_num = i // BATCH_SIZE + 1
-                
-                # Create Compare URL
-                compare_url = f"https://steamdb.info/charts/?compare={','.join(map(str, batch))}"
-                
-                print(f"[{batch_num}/{total_batches}] Обработка батча: {len(batch)} APP IDs")
-                print(f"   URL: {compare_url}")
+        backoff = 0.0
+        queue = asyncio.Queue()
+        for batch_num, compare_url in enumerate(compare_urls, 1):
+            queue.put_nowait((batch_num, compare_url))
+        
+        async def worker(worker_pages):
+            """
+            Вкладки воркера берут батчи из общей очереди, пока она не опустеет.
+            Пока расширение собирает данные текущего батча, следующие уже загружаются в запасных вкладках
+            """
+            nonlocal processed, backoff
+            throttled = False
+            
+            def on_response(response):
+                nonlocal throttled
+                if response.status in (429, 503):
+                    throttled = True
+            
+            free_pages = deque(worker_pages)
+            for worker_page in worker_pages:
+                worker_page.on("response", on_response)
+            
+            in_flight = deque()  # (batch_num, вкладка, задача навигации) в порядке очереди
+            while True:
+                while free_pages and not queue.empty():
+                    batch_num, compare_url = queue.get_nowait()
+                    worker_page = free_pages.popleft()
+                    print(f"[{batch_num}/{total_batches}] Загрузка батча: {compare_url}")
+                    navigation = asyncio.create_task(
+                        worker_page.goto(compare_url, wait_until="domcontentloaded", timeout=60000)
+                    )
+                    in_flight.append((batch_num, worker_page, navigation))
+                if not in_flight:
+                    return
                 
-                # Navigate to Compare page
-                await page.goto(compare_url, wait_until="networkidle", timeout=60000)
+                batch_num, worker_page, navigation = in_flight.popleft()
+                batch_len = min(BATCH_SIZE, len(app_ids) - (batch_num - 1) * BATCH_SIZE)
+                throttled = False
+                await navigation
                 
-                # Wait for API calls to complete (extension will intercept them)
-                await asyncio.sleep(10)  # Wait for all API calls
+                # Ждем сигнала расширения о скачивании CSV вместо фиксированной паузы
+                try:
+                    result = await asyncio.wait_for(worker_page.evaluate(WAIT_FOR_CSV_JS), BATCH_TIMEOUT)
+                except Exception:
+                    # Таймаут или страница ушла на другую навигацию (например, проверка Cloudflare)
+                    result = None
+                free_pages.append(worker_page)
                 
-                processed += len(batch)
+                processed += batch_len
                 progress = (processed / len(app_ids)) * 100
                 
-                print(f"   ✅ Обработано: {processed}/{len(app_ids)} ({progress:.1f}%)")
+                if result == 'CSV_DOWNLOAD_STARTED':
+                    print(f"   ✅ [{batch_num}] Обработано: {processed}/{len(app_ids)} ({progress:.1f}%)")
+                else:
+                    print(f"   ⚠️ [{batch_num}] CSV не скачан ({result or 'timeout'}): {processed}/{len(app_ids)} ({progress:.1f}%)")
                 print()
                 
-                # Small delay between batches
-                await asyncio.sleep(2)
-                
+                # Пауза только после ограничения со стороны SteamDB: растет при 429/503, убывает без них
+                if throttled:
+                    backoff = min(max(backoff * 2, 2.0), MAX_BACKOFF)
+                    print(f"   ⏳ SteamDB ограничивает запросы, пауза {backoff:.0f} с")
+                else:
+                    backoff /= 2
+                if backoff >= 1:
+                    await asyncio.sleep(backoff)
+        
+        try:
+            # Первая вкладка уже прошла Cloudflare; остальные используют cookies того же профиля
+            # У каждого воркера 1 + PREFETCH_DEPTH вкладок: одновременно загружается не больше
+            # PARALLEL_PAGES * (1 + PREFETCH_DEPTH) страниц Compare
+            await context.add_init_script(CSV_LISTENER_JS)
+            tabs_per_worker = 1 + PREFETCH_DEPTH
+            pages = [page] + [
+                await context.new_page()
+                for _ in range(min(PARALLEL_PAGES * tabs_per_worker, total_batches) - 1)
+            ]
+            await asyncio.gather(*(
+                worker(pages[i:i + tabs_per_worker])
+                for i in range(0, len(pages), tabs_per_worker)
+            ))
+            
         except KeyboardInterrupt:
             print(f"\n⏹️  Остановлено пользователем")
             print(f"📊 Обработано: {processed}/{len(app_ids)} APP IDs")
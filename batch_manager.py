@@ -2,7 +2,7 @@
 Batch manager for grouping APP IDs for Compare requests
 """
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import config
 
 logger = logging.getLogger(__name__)
@@ -14,57 +14,50 @@ class BatchManager:
     def __init__(self, app_ids: List[int], batch_size: int = None):
         self.app_ids = app_ids
         self.batch_size = batch_size or config.COMPARE_BATCH_SIZE
-        self.batches = self._create_batches()
-        self.processed_batches = set()
+        # Batches are sliced from app_ids on demand instead of being materialised up front
+        self.total_batches = -(-len(app_ids) // self.batch_size)
+        # One flag per batch position: O(1) mark/test without hashing the batch contents
+        self._processed = bytearray(self.total_batches)
+        self._processed_count = 0
         self.current_index = 0
-    
-    def _create_batches(self) -> List[List[int]]:
-        """Create batches from APP IDs list"""
-        batches = []
-        for i in range(0, len(self.app_ids), self.batch_size):
-            batch = self.app_ids[i:i + self.batch_size]
-            batches.append(batch)
         
-        logger.info(f"Created {len(batches)} batches from {len(self.app_ids)} APP IDs")
-        return batches
+        logger.info(f"Created {self.total_batches} batches from {len(self.app_ids)} APP IDs")
+    
+    def _batch(self, batch_index: int) -> List[int]:
+        """APP IDs of the batch at batch_index"""
+        start = batch_index * self.batch_size
+        return self.app_ids[start:start + self.batch_size]
     
-    def get_next_batch(self) -> Optional[List[int]]:
-        """Get next unprocessed batch"""
-        while self.current_index < len(self.batches):
-            batch = self.batches[self.current_index]
-            batch_key = tuple(batch)
-            
-            if batch_key not in self.processed_batches:
-                self.current_index += 1
-                return batch
-            
-            self.current_index += 1
+    def get_next_batch(self) -> Optional[Tuple[int, List[int]]]:
+        """Get next unprocessed batch as (batch_index, batch)"""
+        # Unprocessed flags are zero bytes: find() skips processed batches in C
+        index = self._processed.find(0, self.current_index)
+        if index < 0:
+            self.current_index = self.total_batches
+            return None
         
-        return None
+        self.current_index = index + 1
+        return index, self._batch(index)
     
-    def mark_batch_processed(self, batch: List[int]):
-        """Mark batch as processed"""
-        batch_key = tuple(batch)
-        self.processed_batches.add(batch_key)
-        logger.debug(f"Marked batch with {len(batch)} APP IDs as processed")
+    def mark_batch_processed(self, batch_index: int):
+        """Mark batch (by its index from get_next_batch) as processed"""
+        if not self._processed[batch_index]:
+            self._processed[batch_index] = 1
+            self._processed_count += 1
+        logger.debug(f"Marked batch {batch_index} as processed")
     
     def get_pending_batches(self) -> List[List[int]]:
         """Get all pending batches"""
-        pending = []
-        for i, batch in enumerate(self.batches):
-            batch_key = tuple(batch)
-            if batch_key not in self.processed_batches:
-                pending.append(batch)
-        return pending
+        return [self._batch(i) for i, processed in enumerate(self._processed) if not processed]
     
     def has_pending_batches(self) -> bool:
         """Check if there are pending batches"""
-        return len(self.get_pending_batches()) > 0
+        return self._processed_count < self.total_batches
     
     def get_progress(self) -> dict:
         """Get batch processing progress"""
-        total = len(self.batches)
-        processed = len(self.processed_batches)
+        total = self.total_batches
+        processed = self._processed_count
         pending = total - processed
         
         return {
@@ -73,4 +66,3 @@ class BatchManager:
             'pending_batches': pending,
             'progress_percent': (processed / total * 100) if total > 0 else 0
         }
-
@@ -1,17 +1,31 @@
 """
 Browser manager with context pool for parallel processing
 """
+import os
 import json
+import hashlib
 import logging
+import re
+import time
 from pathlib import Path
 from typing import Optional, List, Dict
-from threading import Lock
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 import asyncio
 import config
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Cookies are read from a returned context at most this often (each read is a CDP round trip)
+COOKIE_FETCH_INTERVAL = 30
+# The background flusher writes the latest collected cookies to disk this often
+COOKIE_FLUSH_INTERVAL = 5
+
 
 class BrowserManager:
     """Browser manager with context pool for parallel processing"""
@@ -21,9 +35,24 @@ class BrowserManager:
         self.playwright = None
         self.browser: Optional[Browser] = None
         self.contexts: List[BrowserContext] = []
-        self.available_contexts: List[BrowserContext] = []
-        self.context_lock = Lock()
+        # Idle contexts: get() waits on the event loop until one is returned, no polling
+        self.available_contexts: asyncio.Queue = asyncio.Queue()
+        self._idle_contexts = set()
         self.cookies_file = config.COOKIES_FILE
+        # Parsed cookies file, reread only when the file changes on disk:
+        # (st_mtime_ns, st_size) of the cached read, the serialized bytes and their digest
+        self._cookie_stat = None
+        self._cookie_data = b''
+        self._cookie_cache: List[Dict] = []
+        self._cookie_digest = b''
+        # Digest of the cookies each context already holds, so unchanged cookies are not re-applied
+        self._applied_cookies: Dict[BrowserContext, bytes] = {}
+        # Latest cookies waiting for the background flusher: (context they came from, cookies)
+        self._pending_cookies = None
+        self._last_cookie_fetch = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        # Resource blocking rules, compiled once: a set of resource types and one URL-suffix regex
+        self._blocked_types, self._blocked_url = self._compile_blocking_rules()
         
     async def initialize(self):
         """Initialize browser and create context pool"""
@@ -108,30 +137,70 @@ class BrowserManager:
         
         # Create context pool
         await self.create_context_pool(self.num_contexts, cookies)
+        self._flush_task = asyncio.create_task(self._cookie_flusher())
         
         logger.info(f"Browser initialized with {len(self.contexts)} contexts")
     
     def _load_cookies(self) -> List[Dict]:
-        """Load cookies from file"""
-        if self.cookies_file.exists():
-            try:
-                with open(self.cookies_file, 'r') as f:
-                    cookies = json.load(f)
-                    logger.info(f"Loaded {len(cookies)} cookies from file")
-                    return cookies
-            except Exception as e:
-                logger.warning(f"Failed to load cookies: {e}")
-        return []
+        """Load cookies from file (cached until the file's mtime or size changes)"""
+        try:
+            stat = self.cookies_file.stat()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            logger.warning(f"Failed to load cookies: {e}")
+            return []
+        
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._cookie_stat:
+            return self._cookie_cache
+        
+        try:
+            with open(self.cookies_file, 'rb') as f:
+                data = f.read()
+            cookies = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+            logger.info(f"Loaded {len(cookies)} cookies from file")
+        except Exception as e:
+            logger.warning(f"Failed to load cookies: {e}")
+            return []
+        
+        self._remember_cookies(cookies, data, key)
+        return cookies
+    
+    def _remember_cookies(self, cookies: List[Dict], data: bytes, stat_key):
+        """Cache the cookies last read from or written to the file"""
+        self._cookie_stat = stat_key
+        self._cookie_data = data
+        self._cookie_cache = cookies
+        self._cookie_digest = hashlib.blake2b(data, digest_size=16).digest()
     
     def _save_cookies(self, cookies: List[Dict]):
-        """Save cookies to file"""
+        """
+        Save cookies to file (skipped when they equal what the file already holds).
+        Written to a temporary file and swapped in with os.replace, so readers never see a torn file.
+        """
         try:
-            with open(self.cookies_file, 'w') as f:
-                json.dump(cookies, f, indent=2)
+            data = orjson.dumps(cookies) if ORJSON_AVAILABLE else json.dumps(cookies).encode('utf-8')
+            if data == self._cookie_data:
+                return
+            tmp_path = self.cookies_file.with_name(f"{self.cookies_file.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.cookies_file)
+            stat = self.cookies_file.stat()
+            self._remember_cookies(cookies, data, (stat.st_mtime_ns, stat.st_size))
             logger.debug(f"Saved {len(cookies)} cookies to file")
         except Exception as e:
             logger.warning(f"Failed to save cookies: {e}")
     
+    async def _apply_cookies(self, context: BrowserContext, cookies: List[Dict]):
+        """Replace the context's cookies with the cached file contents, unless it already has them"""
+        if not cookies or self._applied_cookies.get(context) == self._cookie_digest:
+            return
+        await context.clear_cookies()
+        await context.add_cookies(cookies)
+        self._applied_cookies[context] = self._cookie_digest
+    
     async def create_context_pool(self, size: int, cookies: List[Dict] = None):
         """Create pool of browser contexts"""
         # For Cloudflare bypass, we'll use fewer contexts but reuse them
@@ -173,6 +242,7 @@ class BrowserManager:
             # Load cookies if available
             if cookies:
                 await context.add_cookies(cookies)
+                self._applied_cookies[context] = self._cookie_digest
             
             # Inject JavaScript to make browser look more realistic
             await context.add_init_script("""
@@ -196,90 +266,140 @@ class BrowserManager:
             """)
             
             self.contexts.append(context)
-            self.available_contexts.append(context)
+            self._put_available(context)
         
         logger.info(f"Created context pool with {actual_size} contexts")
     
+    @staticmethod
+    def _compile_blocking_rules():
+        """Blocked resource types and a regex for blocked URLs (suffixes, hosts), from the DISABLE_* flags and BLOCKED_HOSTS"""
+        types = set()
+        suffixes = []
+        if config.DISABLE_IMAGES:
+            types.add("image")
+        if config.DISABLE_CSS:
+            types.add("stylesheet")
+            suffixes.append("css")
+        if config.DISABLE_FONTS:
+            types.add("font")
+            suffixes.extend(["woff", "woff2", "ttf", "otf"])
+        if config.DISABLE_MEDIA:
+            types.add("media")
+        
+        patterns = []
+        if suffixes:
+            patterns.append(r"\.(?:%s)$" % "|".join(suffixes))
+        if config.BLOCKED_HOSTS:
+            hosts = "|".join(re.escape(host) for host in config.BLOCKED_HOSTS)
+            patterns.append(r"^[a-z]+://(?:[^/?#]*\.)?(?:%s)(?::\d+)?(?:[/?#]|$)" % hosts)
+        
+        url_re = re.compile("|".join(patterns)) if patterns else None
+        return frozenset(types), url_re
+    
     async def _setup_resource_blocking(self, context: BrowserContext):
         """Set up resource blocking for optimization"""
+        if not self._blocked_types and not self._blocked_url:
+            # Nothing to block: an interception round-trip per request would be pure overhead
+            return
+        
+        blocked_types = self._blocked_types
+        blocked_url = self._blocked_url.search if self._blocked_url else None
+        
         async def route_handler(route):
-            resource_type = route.request.resource_type
-            url = route.request.url
-            
-            # Block images
-            if config.DISABLE_IMAGES and resource_type == "image":
-                await route.abort()
-                return
-            
-            # Block CSS
-            if config.DISABLE_CSS and (resource_type == "stylesheet" or url.endswith('.css')):
-                await route.abort()
-                return
-            
-            # Block fonts
-            if config.DISABLE_FONTS and (resource_type == "font" or 
-                                         any(url.endswith(ext) for ext in ['.woff', '.woff2', '.ttf', '.otf'])):
+            request = route.request
+            if request.resource_type in blocked_types or (blocked_url and blocked_url(request.url)):
                 await route.abort()
                 return
-            
             await route.continue_()
         
         await context.route("**/*", route_handler)
     
+    def _put_available(self, context: BrowserContext):
+        """Put context back into the idle queue (once, even if returned twice)"""
+        if context not in self._idle_contexts:
+            self._idle_contexts.add(context)
+            self.available_contexts.put_nowait(context)
+    
+    def _take_available(self, context: BrowserContext) -> BrowserContext:
+        """Mark a context taken from the idle queue as in use"""
+        self._idle_contexts.discard(context)
+        return context
+    
     async def get_context(self) -> BrowserContext:
-        """Get available context from pool (blocking)"""
-        while True:
-            with self.context_lock:
-                if self.available_contexts:
-                    context = self.available_contexts.pop()
-                    # Reload cookies before returning context to ensure session continuity
-                    cookies = self._load_cookies()
-                    if cookies:
-                        try:
-                            await context.clear_cookies()
-                            await context.add_cookies(cookies)
-                        except Exception as e:
-                            logger.debug(f"Failed to reload cookies: {e}")
-                    return context
-            
-            # Wait a bit if no context available
-            await asyncio.sleep(0.1)
+        """Get available context from pool (waits until one is returned)"""
+        context = self._take_available(await self.available_contexts.get())
+        # Reload cookies before returning context to ensure session continuity
+        # (only if the file changed since this context last received them)
+        try:
+            await self._apply_cookies(context, self._load_cookies())
+        except Exception as e:
+            logger.debug(f"Failed to reload cookies: {e}")
+        return context
     
     def get_context_sync(self) -> BrowserContext:
-        """Get available context from pool (synchronous, for testing)"""
-        while True:
-            with self.context_lock:
-                if self.available_contexts:
-                    context = self.available_contexts.pop()
-                    return context
-            
-            # Wait a bit if no context available
-            import time
-            time.sleep(0.1)
+        """Get available context from pool without waiting (for testing)
+        
+        Raises:
+            asyncio.QueueEmpty: all contexts are in use
+        """
+        return self._take_available(self.available_contexts.get_nowait())
     
     async def return_context(self, context: BrowserContext):
-        """Return context to pool and save cookies"""
-        # Save cookies before returning context to maintain session
+        """Return context to pool; its cookies are saved by the background flusher"""
+        await self.schedule_cookie_save(context)
+        
+        if context in self.contexts:
+            self._put_available(context)
+    
+    async def schedule_cookie_save(self, context: BrowserContext):
+        """
+        Collect the context's cookies for the background flusher to write to disk.
+        Cookies are read at most once per COOKIE_FETCH_INTERVAL; only the latest set is kept.
+        """
+        now = time.monotonic()
+        if now - self._last_cookie_fetch < COOKIE_FETCH_INTERVAL:
+            return
+        self._last_cookie_fetch = now
         try:
             cookies = await context.cookies()
-            if cookies:
-                self._save_cookies(cookies)
-                logger.debug(f"Saved {len(cookies)} cookies from context")
         except Exception as e:
-            logger.debug(f"Failed to save cookies: {e}")
-        
-        with self.context_lock:
-            if context in self.contexts and context not in self.available_contexts:
-                self.available_contexts.append(context)
+            logger.debug(f"Failed to read cookies: {e}")
+            return
+        if cookies:
+            self._pending_cookies = (context, cookies)
+    
+    def _flush_cookies(self):
+        """Write the latest collected cookies to disk (if any)"""
+        pending, self._pending_cookies = self._pending_cookies, None
+        if pending is None:
+            return
+        context, cookies = pending
+        self._save_cookies(cookies)
+        # The file now holds exactly this context's cookies
+        self._applied_cookies[context] = self._cookie_digest
+        logger.debug(f"Saved {len(cookies)} cookies from context")
+    
+    async def _cookie_flusher(self):
+        """Background task: periodically persist collected cookies"""
+        while True:
+            await asyncio.sleep(COOKIE_FLUSH_INTERVAL)
+            self._flush_cookies()
     
     async def save_cookies_from_context(self, context: BrowserContext):
-        """Save cookies from a context"""
+        """Save cookies from a context right away (replaces any set still waiting for the flusher)"""
         cookies = await context.cookies()
         if cookies:
+            self._pending_cookies = None
             self._save_cookies(cookies)
+            self._applied_cookies[context] = self._cookie_digest
     
     async def close(self):
         """Close all contexts and browser"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._flush_cookies()
+        
         # Save cookies from first context before closing (if still open)
         if self.contexts:
             try:
@@ -342,7 +462,8 @@ class BrowserManagerSync:
     
     def return_context(self, context):
         """Return context (sync)"""
-        self.manager.return_context(context)
+        loop = self._get_loop()
+        loop.run_until_complete(self.manager.return_context(context))
     
     def close(self):
         """Close browser (sync)"""
@@ -1,20 +1,104 @@
 """
 CCU parser using Compare tool for batch processing
 """
+import re
+import json
 import logging
 import asyncio
-from typing import List, Dict, Optional
+import time
+from typing import Awaitable, Callable, List, Dict, Optional
 from datetime import datetime
 import config
 
+# Faster JSON decoding of API responses if orjson is installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+CLOUDFLARE_TITLE = "Just a moment"  # Title of the Cloudflare challenge page
+CLOUDFLARE_STATUSES = (403, 503)  # Statuses the challenge page is served with
+CLOUDFLARE_POLL_INTERVAL = 0.5  # seconds between clearance checks while a challenge is shown
+API_RESPONSES_TIMEOUT = 30  # seconds to wait for GetGraphMax responses of all APP IDs in a batch
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Exact shape of API datetime strings ('YYYY-MM-DD HH:MM:SS', with ' ' or 'T'): parsed by fromisoformat
+_API_DATETIME = re.compile(r'\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d')
+# String formats accepted from the API otherwise; strings matching none are kept as is
+DATETIME_INPUT_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%d %H:%M:%S.%f'
+)
+
 
 class CCUParser:
     """Parser for CCU data using Compare tool"""
     
-    def __init__(self):
+    def __init__(self, on_challenge_passed: Optional[Callable[[object], Awaitable[None]]] = None):
+        """
+        Args:
+            on_challenge_passed: Coroutine called with the browser context right after it passed
+                a Cloudflare challenge (e.g. to persist the clearance cookies for other contexts)
+        """
         self.timeout = config.REQUEST_TIMEOUT * 1000  # milliseconds
+        self.on_challenge_passed = on_challenge_passed
+        # Idle pages per browser context, reused across batches instead of new_page() each time
+        self._idle_pages: Dict[object, List] = {}
+    
+    async def _acquire_page(self, context):
+        """Check out an idle page of the context, or open a new one"""
+        pages = self._idle_pages.get(context)
+        while pages:
+            page = pages.pop()
+            if not page.is_closed():
+                return page
+        return await context.new_page()
+    
+    async def _release_page(self, context, page, reusable: bool):
+        """Return the page to the context's idle pages, or close it if it may be in a bad state"""
+        if reusable and not page.is_closed():
+            self._idle_pages.setdefault(context, []).append(page)
+            return
+        try:
+            await page.close()
+        except Exception as e:
+            logger.debug(f"Failed to close page: {e}")
+    
+    @staticmethod
+    async def _is_cloudflare_challenge(page) -> bool:
+        """Whether the page currently shows the Cloudflare challenge"""
+        try:
+            return (await page.title()).startswith(CLOUDFLARE_TITLE)
+        except Exception:
+            # Title is unavailable while the challenge redirects to the real page
+            return True
+    
+    async def _wait_for_cloudflare(self, page, response) -> bool:
+        """
+        Wait for the Cloudflare challenge only if one was served.
+        Polls until the challenge page is replaced, for at most CLOUDFLARE_WAIT_TIME.
+        
+        Returns:
+            True if a challenge was served and passed
+        """
+        challenged = response is not None and response.status in CLOUDFLARE_STATUSES
+        if not challenged and not await self._is_cloudflare_challenge(page):
+            return False
+        
+        logger.debug("Waiting for Cloudflare challenge to complete...")
+        deadline = time.monotonic() + config.CLOUDFLARE_WAIT_TIME
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CLOUDFLARE_POLL_INTERVAL)
+            if not await self._is_cloudflare_challenge(page):
+                logger.debug("Cloudflare challenge passed")
+                return True
+        logger.warning("Cloudflare challenge did not complete in time, continuing anyway")
+        return False
     
     async def parse_ccu_batch(self, context, app_ids: List[int]) -> Dict[int, List[Dict]]:
         """
@@ -33,11 +117,14 @@ class CCUParser:
             
             logger.debug(f"Fetching CCU data for {len(app_ids)} APP IDs via Compare")
             
-            # Create page
-            page = await context.new_page()
+            # Check out a page (already on SteamDB if it was used for a previous batch)
+            page = await self._acquire_page(context)
+            reusable = False
             
             # Set up response interceptor BEFORE navigation
             api_responses = {}
+            expected = set(app_ids)
+            all_received = asyncio.Event()
             
             async def handle_response(response):
                 url_str = response.url
@@ -48,8 +135,10 @@ class CCUParser:
                             app_id = int(app_id_match)
                             if response.status == 200:
                                 try:
-                                    data = await response.json()
+                                    data = await self._read_json(response)
                                     api_responses[app_id] = data
+                                    if expected <= api_responses.keys():
+                                        all_received.set()
                                     logger.info(f"✅ Intercepted API response for app_id {app_id}: {len(data) if isinstance(data, list) else 'not a list'} items")
                                 except Exception as e:
                                     logger.debug(f"Failed to parse JSON for app_id {app_id}: {e}")
@@ -61,18 +150,22 @@ class CCUParser:
             try:
                 # Navigate to Compare page and wait for it to fully load
                 logger.debug(f"Navigating to {url}")
-                # Use domcontentloaded first, then wait for networkidle
-                await page.goto(url, wait_until="domcontentloaded", timeout=self.timeout)
+                # Use domcontentloaded, then wait for the API responses themselves
+                response = await page.goto(url, wait_until="domcontentloaded", timeout=self.timeout)
                 
                 # Wait for Cloudflare challenge to complete (if present)
-                logger.debug("Waiting for Cloudflare challenge to complete...")
-                await asyncio.sleep(config.CLOUDFLARE_WAIT_TIME)
+                if await self._wait_for_cloudflare(page, response) and self.on_challenge_passed:
+                    try:
+                        await self.on_challenge_passed(context)
+                    except Exception as e:
+                        logger.warning(f"Failed to handle passed Cloudflare challenge: {e}")
                 
-                # Now wait for network to be idle (all API calls completed)
+                # Wait until every APP ID's API response was intercepted
+                # (instead of networkidle, which background requests can hold off until its timeout)
                 try:
-                    await page.wait_for_load_state("networkidle", timeout=30000)
-                except Exception as e:
-                    logger.debug(f"Networkidle timeout, continuing anyway: {e}")
+                    await asyncio.wait_for(all_received.wait(), timeout=API_RESPONSES_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.debug(f"Got API responses for {len(api_responses)}/{len(expected)} APP IDs, continuing anyway")
                 
                 # Extract data from intercepted responses
                 results = {}
@@ -96,10 +189,12 @@ class CCUParser:
                             logger.warning(f"No data returned for app_id {app_id}")
                             results[app_id] = []
                 
+                reusable = True
                 return results
                 
             finally:
-                await page.close()
+                page.remove_listener("response", handle_response)
+                await self._release_page(context, page, reusable)
                 
         except Exception as e:
             logger.error(f"Error parsing CCU batch: {e}")
@@ -120,7 +215,7 @@ class CCUParser:
                     timeout=30000  # 30 seconds instead of 10
                 )
                 if response:
-                    data = await response.json()
+                    data = await self._read_json(response)
                     logger.debug(f"Got API response via wait_for_response for app_id {app_id}: {len(data) if isinstance(data, list) else 'not a list'} items")
                     return self._parse_api_response(data, app_id)
             except asyncio.TimeoutError:
@@ -135,7 +230,7 @@ class CCUParser:
                 response = await page.request.get(api_url)
                 logger.debug(f"Direct API request status for app_id {app_id}: {response.status}")
                 if response.status == 200:
-                    data = await response.json()
+                    data = await self._read_json(response)
                     logger.debug(f"Got API response via direct request for app_id {app_id}: {len(data) if isinstance(data, list) else 'not a list'} items")
                     return self._parse_api_response(data, app_id)
                 elif response.status == 403:
@@ -179,11 +274,27 @@ class CCUParser:
             logger.error(f"API fetch failed for app_id {app_id}: {e}", exc_info=True)
             return []
     
+    @staticmethod
+    async def _read_json(response):
+        """Decode a response body as JSON (orjson if available)"""
+        body = await response.body()
+        return orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
+    
     def _parse_api_response(self, data: List, app_id: int) -> List[Dict]:
         """Parse API response data"""
         if not isinstance(data, list):
             return []
         
+        # Common format: [timestamp, players] pairs - one comprehension, no per-item type checks
+        if data and isinstance(data[0], list):
+            normalize = self._normalize_datetime
+            try:
+                result = [{'datetime': normalize(item[0]), 'players': int(item[1])} for item in data]
+                logger.debug(f"Parsed {len(result)} data points for app_id {app_id}")
+                return result
+            except (TypeError, IndexError, ValueError, KeyError):
+                pass  # Irregular rows - fall back to the item-by-item parser
+        
         result = []
         for item in data:
             if isinstance(item, dict):
@@ -212,28 +323,27 @@ class CCUParser:
     def _normalize_datetime(self, timestamp) -> str:
         """Normalize datetime to YYYY-MM-DD HH:MM:SS format"""
         try:
-            # Handle Unix timestamp (seconds)
+            # Handle Unix timestamp (seconds) - the common case, formatted without building a datetime
             if isinstance(timestamp, (int, float)):
                 if timestamp > 1e10:  # milliseconds
                     timestamp = timestamp / 1000
-                dt = datetime.fromtimestamp(timestamp)
-                return dt.strftime('%Y-%m-%d %H:%M:%S')
+                return time.strftime(DATETIME_FORMAT, time.localtime(timestamp))
             
             # Handle string timestamps
             if isinstance(timestamp, str):
-                # Try various formats
-                formats = [
-                    '%Y-%m-%d %H:%M:%S',
-                    '%Y-%m-%dT%H:%M:%S',
-                    '%Y-%m-%dT%H:%M:%SZ',
-                    '%Y-%m-%d %H:%M:%S.%f'
-                ]
+                # The format the API returns parses without trying formats. Only that exact shape:
+                # fromisoformat also accepts date-only and offset strings, which must stay as they were
+                if _API_DATETIME.fullmatch(timestamp):
+                    try:
+                        return datetime.fromisoformat(timestamp).strftime(DATETIME_FORMAT)
+                    except ValueError:
+                        pass
                 
-                for fmt in formats:
+                for fmt in DATETIME_INPUT_FORMATS:
                     try:
                         dt = datetime.strptime(timestamp, fmt)
-                        return dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
+                        return dt.strftime(DATETIME_FORMAT)
+                    except ValueError:
                         continue
             
             # Fallback
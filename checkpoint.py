@@ -3,11 +3,14 @@ Checkpoint manager for tracking parsing progress
 """
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Dict, Optional
 from pathlib import Path
 from datetime import datetime
 import config
-from database import Database
+from database import Database, APP_STATUS_FIELDS
 
 logger = logging.getLogger(__name__)
 
@@ -18,33 +21,82 @@ class CheckpointManager:
     def __init__(self, database: Database):
         self.database = database
         self.checkpoint_file = config.CHECKPOINT_FILE
+        # Status updates not yet written: app_id -> app_status columns (later marks override earlier ones).
+        # RLock: signal handlers flush via save_checkpoint() and may interrupt a flush in the same thread
+        self._pending_updates: Dict[int, Dict] = {}
+        self._pending_lock = threading.RLock()
+        self._last_flush = time.monotonic()
+        # Last written update of recently flushed apps (at most DB_BATCH_SIZE), so deciding the next
+        # status of an app marked a moment ago needs no SELECT. Trusted only within a batch:
+        # start_batch() drops it, since app_status may also be changed by SQL elsewhere (API resets)
+        self._written_updates: OrderedDict = OrderedDict()
     
-    def initialize_app_ids(self, app_ids: List[int]):
-        """Initialize APP IDs in database if not already present"""
-        conn = self.database.get_connection()
-        use_postgresql = self.database.use_postgresql
+    def _update_app_status(self, app_id: int, status: str, **kwargs):
+        """Queue an app status update; written in bulk every DB_BATCH_SIZE apps or CHECKPOINT_FLUSH_INTERVAL"""
+        update = {'status': status, 'last_updated': datetime.now().isoformat()}
+        for key, value in kwargs.items():
+            if key in APP_STATUS_FIELDS:
+                update[key] = value
         
-        # Используем правильный placeholder в зависимости от БД
-        param = '%s' if use_postgresql else '?'
-        
-        initialized = 0
-        for app_id in app_ids:
-            # Check if app_id already exists
-            query = f"SELECT app_id FROM app_status WHERE app_id = {param}"
-            cursor = conn.cursor()
-            cursor.execute(query, (app_id,))
-            if not cursor.fetchone():
-                # Insert as pending
-                insert_query = f"""INSERT INTO app_status (app_id, status, last_updated) 
-                       VALUES ({param}, 'pending', {param})"""
-                cursor.execute(insert_query, (app_id, datetime.now().isoformat()))
-                initialized += 1
+        with self._pending_lock:
+            self._pending_updates.setdefault(app_id, {}).update(update)
+            due = (len(self._pending_updates) >= config.DB_BATCH_SIZE
+                   or time.monotonic() - self._last_flush >= config.CHECKPOINT_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+    
+    def _get_app_status(self, app_id: int, fields: tuple) -> Optional[Dict]:
+        """
+        App status including updates that are still queued.
+        Read from the database only if this manager has not written all of `fields` for the app recently.
+        """
+        with self._pending_lock:
+            known = {**self._written_updates.get(app_id, {}), **self._pending_updates.get(app_id, {})}
+        if all(field in known for field in fields):
+            return known
         
-        conn.commit()
+        current_status = self.database.get_app_status(app_id)
+        if known:
+            current_status = {**(current_status or {}), **known}
+        return current_status
+    
+    def start_batch(self):
+        """Forget recently written statuses: the next batch reads app_status from the database"""
+        with self._pending_lock:
+            self._written_updates.clear()
+    
+    def flush(self):
+        """Write queued app status updates to the database"""
+        with self._pending_lock:
+            pending, self._pending_updates = self._pending_updates, {}
+            self._last_flush = time.monotonic()
+            if not pending:
+                return
+            try:
+                self.database.update_app_statuses(pending)
+            except Exception:
+                # Requeue for the next flush; updates queued since then stay newer
+                for app_id, update in pending.items():
+                    self._pending_updates[app_id] = {**update, **self._pending_updates.get(app_id, {})}
+                raise
+            
+            # Keep what was written as is: on SQLite the upsert replaces the whole row
+            for app_id, update in pending.items():
+                self._written_updates.pop(app_id, None)
+                self._written_updates[app_id] = update
+            while len(self._written_updates) > config.DB_BATCH_SIZE:
+                self._written_updates.popitem(last=False)
+        logger.debug(f"Flushed {len(pending)} app status updates")
+    
+    def initialize_app_ids(self, app_ids: List[int]):
+        """Initialize APP IDs in database if not already present"""
+        initialized = self.database.insert_pending_app_ids(app_ids)
         logger.info(f"Initialized {initialized} APP IDs in database")
     
     def get_pending_app_ids(self) -> List[int]:
         """Get list of pending APP IDs"""
+        self.flush()
+        self.start_batch()
         conn = self.database.get_connection()
         cursor = conn.cursor()
         
@@ -55,7 +107,7 @@ class CheckpointManager:
     def mark_ccu_done(self, app_id: int, ccu_count: int):
         """Mark CCU as done for app_id"""
         status = 'ccu_done' if ccu_count > 0 else 'ccu_error'
-        self.database.update_app_status(
+        self._update_app_status(
             app_id, 
             status,
             ccu_processed=ccu_count
@@ -64,8 +116,8 @@ class CheckpointManager:
     
     def mark_price_done(self, app_id: int, price_count: int):
         """Mark Price as done for app_id"""
-        # Get current status
-        current_status = self.database.get_app_status(app_id)
+        # Get current status (usually known from mark_ccu_done of the same batch)
+        current_status = self._get_app_status(app_id, ('status', 'ccu_processed'))
         ccu_count = current_status.get('ccu_processed', 0) if current_status else 0
         
         if price_count > 0:
@@ -79,7 +131,7 @@ class CheckpointManager:
             else:
                 status = 'price_error'
         
-        self.database.update_app_status(
+        self._update_app_status(
             app_id,
             status,
             price_processed=price_count
@@ -88,7 +140,7 @@ class CheckpointManager:
     
     def mark_app_completed(self, app_id: int, ccu_count: int, price_count: int):
         """Mark app as fully completed"""
-        self.database.update_app_status(
+        self._update_app_status(
             app_id,
             'completed',
             ccu_processed=ccu_count,
@@ -99,11 +151,11 @@ class CheckpointManager:
     def mark_app_error(self, app_id: int, error_type: str, error_message: str, url: str = None):
         """Mark error for app_id"""
         # Get current status
-        current_status = self.database.get_app_status(app_id)
+        current_status = self._get_app_status(app_id, ('status',))
         
         if error_type == 'ccu':
             status = 'ccu_error'
-            self.database.update_app_status(
+            self._update_app_status(
                 app_id,
                 status,
                 ccu_error=error_message,
@@ -114,7 +166,7 @@ class CheckpointManager:
                 status = 'both_error'
             else:
                 status = 'price_error'
-            self.database.update_app_status(
+            self._update_app_status(
                 app_id,
                 status,
                 price_error=error_message,
@@ -126,14 +178,14 @@ class CheckpointManager:
                 status = 'itad_error'
             else:
                 status = 'itad_error'
-            self.database.update_app_status(
+            self._update_app_status(
                 app_id,
                 status,
                 itad_error=error_message
             )
         else:
             status = 'both_error'
-            self.database.update_app_status(
+            self._update_app_status(
                 app_id,
                 status,
                 ccu_error=error_message if error_type == 'ccu' else None,
@@ -148,13 +200,13 @@ class CheckpointManager:
     
     def mark_itad_processing(self, app_id: int):
         """Mark app as being processed by ITAD parser"""
-        self.database.update_app_status(app_id, 'itad_processing')
+        self._update_app_status(app_id, 'itad_processing')
         logger.debug(f"Marked app_id {app_id} as ITAD processing")
     
     def mark_itad_currencies_checked(self, app_id: int, currencies: List[str]):
         """Mark currencies as checked for app_id"""
         currencies_str = ','.join(sorted(currencies))
-        self.database.update_app_status(
+        self._update_app_status(
             app_id,
             'itad_processing',
             itad_currencies_checked=currencies_str
@@ -163,7 +215,7 @@ class CheckpointManager:
     
     def mark_itad_completed(self, app_id: int, price_count: int):
         """Mark ITAD parsing as completed for app_id"""
-        self.database.update_app_status(
+        self._update_app_status(
             app_id,
             'itad_completed',
             itad_price_processed=price_count
@@ -182,21 +234,16 @@ class CheckpointManager:
         Returns:
             Number of apps reset
         """
+        self.flush()
+        self.start_batch()  # statuses change in SQL below
         conn = self.database.get_connection()
         cursor = conn.cursor()
         
-        if self.database.use_postgresql:
-            cursor.execute("""
-                UPDATE app_status 
-                SET status = 'pending'
-                WHERE status = 'itad_processing'
-            """)
-        else:
-            cursor.execute("""
-                UPDATE app_status 
-                SET status = 'pending'
-                WHERE status = 'itad_processing'
-            """)
+        cursor.execute("""
+            UPDATE app_status 
+            SET status = 'pending'
+            WHERE status = 'itad_processing'
+        """)
         
         count = cursor.rowcount
         conn.commit()
@@ -208,32 +255,32 @@ class CheckpointManager:
     
     def get_pending_itad_app_ids(self) -> List[int]:
         """Get list of app IDs pending ITAD processing"""
+        self.flush()
+        self.start_batch()
         conn = self.database.get_connection()
         cursor = conn.cursor()
         
         # Get apps that haven't been processed by ITAD yet
         # Use parameterized query for safety
-        if self.database.use_postgresql:
-            cursor.execute("""
-                SELECT app_id FROM app_status 
-                WHERE status NOT IN ('itad_completed', 'itad_error')
-                ORDER BY app_id
-            """)
-        else:
-            cursor.execute("""
-                SELECT app_id FROM app_status 
-                WHERE status NOT IN ('itad_completed', 'itad_error')
-                ORDER BY app_id
-            """)
+        cursor.execute("""
+            SELECT app_id FROM app_status 
+            WHERE status NOT IN ('itad_completed', 'itad_error')
+            ORDER BY app_id
+        """)
         rows = cursor.fetchall()
         return [row[0] for row in rows]
     
     def get_progress(self) -> Dict:
-        """Get parsing progress statistics"""
+        """Get parsing progress statistics (queued status updates are not included until flushed)"""
         return self.database.get_statistics()
     
     def save_checkpoint(self):
-        """Save checkpoint to JSON file"""
+        """Write queued status updates, then save checkpoint to JSON file"""
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to write queued status updates: {e}")
+        
         try:
             stats = self.get_progress()
             checkpoint_data = {
@@ -23,6 +23,10 @@ DATABASE_PUBLIC_URL = os.getenv("DATABASE_PUBLIC_URL", DATABASE_PUBLIC_URL_DEFAU
 DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("DATABASE_PUBLIC_URL") or DATABASE_PUBLIC_URL_DEFAULT  # PostgreSQL connection string from Railway
 USE_POSTGRESQL = DATABASE_URL is not None
 
+# Connection pool used by the API server (connections are reused across requests)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+
 # Create directories if they don't exist
 DATA_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
@@ -32,10 +36,18 @@ DELAY_BETWEEN_REQUESTS = 1.0  # seconds between requests
 REQUEST_TIMEOUT = 90  # seconds (increased for Cloudflare challenge)
 MAX_RETRIES = 3
 STATS_UPDATE_INTERVAL = 100  # update stats every N processed items
+CHECKPOINT_FLUSH_INTERVAL = 5  # seconds between batched app status writes (also flushed every DB_BATCH_SIZE apps)
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "0.5"))  # seconds to reuse /status statistics
+# /events (Server-Sent Events): each client holds a server thread, so the number of streams is capped
+EVENTS_MAX_CLIENTS = int(os.getenv("EVENTS_MAX_CLIENTS", "2"))
+EVENTS_MAX_DURATION = 300  # seconds before a stream is closed (EventSource reconnects automatically)
+EVENTS_HEARTBEAT = 15  # seconds between keepalive comments when nothing changes
+EVENTS_MIN_INTERVAL = 1.0  # minimum seconds between two status frames
 CLOUDFLARE_WAIT_TIME = 15  # seconds to wait for Cloudflare challenge to complete
 
 # Parallelism parameters
 PARALLEL_THREADS = 10  # number of parallel browser contexts
+STEAMDB_WORKERS = 3  # SteamDB batches processed concurrently (more - SteamDB starts rate-limiting)
 COMPARE_BATCH_SIZE = 10  # number of APP IDs in one Compare request (10-20 recommended)
 
 # Browser settings
@@ -46,6 +58,15 @@ CHROME_CHANNEL = "chrome"  # Options: "chrome", "chrome-beta", "msedge", "chromi
 DISABLE_IMAGES = True
 DISABLE_CSS = True
 DISABLE_FONTS = True
+DISABLE_MEDIA = True
+# Third-party analytics/ad hosts (and their subdomains) whose requests are aborted
+BLOCKED_HOSTS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+]
 DISABLE_SCRIPTS = False  # needed for API to work
 
 # Browser viewport
@@ -64,6 +85,10 @@ STEAMDB_API_GRAPH_MAX = f"{STEAMDB_BASE_URL}/api/GetGraphMax"
 
 # Database batch insert size
 DB_BATCH_SIZE = 1000  # insert records in batches
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))  # rows fetched per round trip when exporting CSV
+
+# Read/copy buffer for uploaded app_ids files (multipart parsing and copying to disk)
+UPLOAD_BUFFER_SIZE = int(os.getenv("UPLOAD_BUFFER_SIZE", str(4 * 1024 * 1024)))
 
 # SteamCharts API settings
 STEAMCHARTS_API_URL = "https://steamcharts.com/app/{appid}/chart-data.json"
@@ -74,6 +99,7 @@ STEAMCHARTS_MAX_CONCURRENT = int(os.getenv("STEAMCHARTS_MAX_CONCURRENT", "80"))
 STEAMCHARTS_RETRY_ATTEMPTS = 3
 STEAMCHARTS_RETRY_DELAY = 2.0
 STEAMCHARTS_TIMEOUT = 30
+STEAMCHARTS_HTML_WORKERS = 1  # worker processes parsing SteamCharts HTML pages (outside the parser/API process)
 
 # ITAD API settings
 ITAD_API_KEY = os.getenv("ITAD_API_KEY", "e717cf2ac561530d8f78cd541560feddbc523c27")  # Get from https://isthereanydeal.com/app/
@@ -92,3 +118,30 @@ STEAM_BATCH_DELAY = 0.1  # Delay between batches (seconds)
 LOG_FILE = LOGS_DIR / "parser.log"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+
+# Serving exported files through the front web server (zero-copy sendfile)
+# USE_XSENDFILE=1 hands the transfer off to nginx (X-Accel-Redirect) or Apache mod_xsendfile (X-Sendfile)
+USE_XSENDFILE = os.getenv("USE_XSENDFILE", "0") == "1"
+XSENDFILE_SERVER = os.getenv("XSENDFILE_SERVER", "nginx")  # Options: "nginx", "apache"
+XACCEL_REDIRECT_PREFIX = os.getenv("XACCEL_REDIRECT_PREFIX", "/protected/")  # nginx internal location mapped to DATA_DIR
+
+# Number of reverse proxies in front of the app whose X-Forwarded-* headers are trusted (0 = none)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+# Full exports are also written as <file>.gz once, so downloads never compress per request
+# (served by /download for gzip-capable clients, or by nginx "gzip_static on")
+PRECOMPRESS_EXPORTS = os.getenv("PRECOMPRESS_EXPORTS", "1") == "1"
+EXPORT_GZIP_LEVEL = 6
+EXPORT_STREAM_GZIP_LEVEL = 3  # streamed CSV exports are compressed on the fly, so favour speed
+JSON_GZIP_LEVEL = 1  # JSON responses are compressed per request: fastest level
+JSON_GZIP_MIN_SIZE = int(os.getenv("JSON_GZIP_MIN_SIZE", "1024"))  # smaller bodies are sent as is
+
+# /admin/cache-stats (in-process cache counters) is a debugging aid: the server has no auth, so it is off by default
+CACHE_STATS_ENDPOINT = os.getenv("CACHE_STATS_ENDPOINT", "0") == "1"
+
+# Full export (/export?type=full) is reused while the source data is unchanged and the files are younger than this
+EXPORT_CACHE_TTL = int(os.getenv("EXPORT_CACHE_TTL", "600"))
+EXPORT_WAIT_TIMEOUT = 60  # seconds a request waits for a full export already running in another thread
+EXPORT_KEEP_COUNT = int(os.getenv("EXPORT_KEEP_COUNT", "3"))  # timestamped full exports kept in DATA_DIR, older ones are deleted
+# Streamed CSV exports each hold a pooled DB connection until the download ends; the rest of the pool stays for short requests
+EXPORT_MAX_STREAMS = int(os.getenv("EXPORT_MAX_STREAMS", "2"))
@@ -2,58 +2,84 @@
 """
 Скрипт для экспорта ошибок из базы данных в CSV файл
 """
+import io
 import csv
 from pathlib import Path
+from typing import Iterator, Optional
 from database import Database
 import config
 
-def export_errors_to_csv(db: Database, output_file: Path):
-    """Экспортировать ошибки в CSV файл"""
+ERRORS_CSV_HEADER = ['app_id', 'status', 'ccu_error', 'price_error', 'ccu_url', 'price_url', 'last_updated']
+
+
+def iter_error_rows(db: Database, batch_size: Optional[int] = None) -> Iterator[list]:
+    """Получать записи с ошибками батчами, не загружая всю выборку в память"""
+    batch_size = batch_size or config.EXPORT_BATCH_SIZE
     conn = db.get_connection()
     
-    # Создаем cursor в зависимости от типа БД
+    # На PostgreSQL - серверный (именованный) курсор, SQLite-курсор и так ленивый
     if db.use_postgresql:
-        try:
-            from psycopg2.extras import RealDictCursor
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-        except ImportError:
-            cursor = conn.cursor()
+        cursor = conn.cursor(name='errors_export')
+        cursor.itersize = batch_size
     else:
         cursor = conn.cursor()
     
-    # Получаем все записи с ошибками
-    cursor.execute("""
-        SELECT app_id, status, ccu_error, price_error, ccu_url, price_url, last_updated
-        FROM app_status
-        WHERE status IN ('ccu_error', 'price_error', 'both_error')
-        ORDER BY app_id
-    """)
+    try:
+        # Получаем все записи с ошибками
+        cursor.execute("""
+            SELECT app_id, status, ccu_error, price_error, ccu_url, price_url, last_updated
+            FROM app_status
+            WHERE status IN ('ccu_error', 'price_error', 'both_error')
+            ORDER BY app_id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def iter_errors_csv(db: Database, batch_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Генерировать CSV с ошибками порциями: заголовок вместе с первым батчем, затем по батчу.
+    Если ошибок нет, генератор ничего не выдает.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ERRORS_CSV_HEADER)
     
-    errors = cursor.fetchall()
+    for rows in iter_error_rows(db, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_errors_to_csv(db: Database, output_file: Path):
+    """Экспортировать ошибки в CSV файл"""
+    count = 0
+    f = None
+    try:
+        for rows in iter_error_rows(db):
+            if f is None:
+                # Файл создаем только если есть что записать
+                f = open(output_file, 'w', encoding='utf-8', newline='')
+                writer = csv.writer(f)
+                writer.writerow(ERRORS_CSV_HEADER)
+            writer.writerows(rows)
+            count += len(rows)
+    finally:
+        if f is not None:
+            f.close()
     
-    if not errors:
+    if count == 0:
         print("✅ Нет ошибок для экспорта")
         return 0
     
-    # Записываем в CSV
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['app_id', 'status', 'ccu_error', 'price_error', 'ccu_url', 'price_url', 'last_updated'])
-        
-        for row in errors:
-            if db.use_postgresql:
-                # PostgreSQL возвращает dict-like объект
-                if isinstance(row, dict):
-                    writer.writerow([row['app_id'], row['status'], row['ccu_error'], row['price_error'], 
-                                   row['ccu_url'], row['price_url'], row['last_updated']])
-                else:
-                    writer.writerow(row)
-            else:
-                # SQLite возвращает tuple
-                writer.writerow(row)
-    
-    print(f"✅ Экспортировано {len(errors)} записей с ошибками в {output_file}")
-    return len(errors)
+    print(f"✅ Экспортировано {count} записей с ошибками в {output_file}")
+    return count
 
 if __name__ == "__main__":
     db = Database()
@@ -4,11 +4,12 @@ Export SteamCharts CCU data to CSV format
 Format: ID,datetime,players
 (only average values are exported)
 """
+import io
 import csv
 import sys
 import logging
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from collections import defaultdict
 
 import config
@@ -22,6 +23,74 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+CCU_CSV_HEADER = ['ID', 'datetime', 'players']
+
+CCU_EXPORT_QUERY = """
+    SELECT app_id, datetime, players
+    FROM ccu_history
+    WHERE value_type = 'avg' OR value_type IS NULL
+    ORDER BY app_id, datetime NULLS LAST
+"""
+
+
+def iter_ccu_rows(db: Database, batch_size: Optional[int] = None) -> Iterator[List[tuple]]:
+    """
+    Fetch average CCU rows in batches without loading the whole table into memory
+    
+    PostgreSQL uses a server-side (named) cursor; SQLite cursors are already lazy,
+    so fetchmany() is enough there. NULL values are replaced with empty strings.
+    
+    Args:
+        db: Database instance
+        batch_size: Rows per batch (default: config.EXPORT_BATCH_SIZE)
+    
+    Yields:
+        Lists of (app_id, datetime, players) tuples
+    """
+    batch_size = batch_size or config.EXPORT_BATCH_SIZE
+    conn = db.get_connection()
+    if db.use_postgresql:
+        cursor = conn.cursor(name='ccu_export')
+        cursor.itersize = batch_size
+    else:
+        cursor = conn.cursor()
+    
+    try:
+        # Fetch only average CCU data (value_type='avg')
+        # Включаем записи с NULL значениями (для APP IDs с ошибками)
+        cursor.execute(CCU_EXPORT_QUERY)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [
+                (row[0], row[1] if row[1] is not None else '', row[2] if row[2] is not None else '')
+                for row in rows
+            ]
+    finally:
+        cursor.close()
+
+
+def iter_ccu_csv(db: Database, batch_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Generate the CCU export as CSV text chunks (header first, then one chunk per batch)
+    
+    Args:
+        db: Database instance
+        batch_size: Rows per batch (default: config.EXPORT_BATCH_SIZE)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CCU_CSV_HEADER)
+    yield buffer.getvalue()
+    
+    for rows in iter_ccu_rows(db, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
 def export_to_csv(db: Database, output_file: Path):
     """
     Export CCU data from database to CSV format
@@ -32,20 +101,6 @@ def export_to_csv(db: Database, output_file: Path):
     """
     logger.info(f"Starting CSV export to {output_file}")
     
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    # Fetch only average CCU data (value_type='avg')
-    # Включаем записи с NULL значениями (для APP IDs с ошибками)
-    cursor.execute("""
-        SELECT app_id, datetime, players
-        FROM ccu_history
-        WHERE value_type = 'avg' OR value_type IS NULL
-        ORDER BY app_id, datetime NULLS LAST
-    """)
-    
-    logger.info(f"Loading CCU data from database...")
-    
     # Write to CSV
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
@@ -55,19 +110,13 @@ def export_to_csv(db: Database, output_file: Path):
         writer = csv.writer(f)
         
         # Write header (формат: ID, datetime, players)
-        writer.writerow(['ID', 'datetime', 'players'])
+        writer.writerow(CCU_CSV_HEADER)
         
         # Write data rows
-        for row in cursor.fetchall():
-            app_id = row[0]
-            datetime_str = row[1] if row[1] is not None else ''
-            players = row[2] if row[2] is not None else ''
-            
-            writer.writerow([app_id, datetime_str, players])
-            written_rows += 1
-            
-            if datetime_str == '' or players == '':
-                null_rows += 1
+        for rows in iter_ccu_rows(db):
+            writer.writerows(rows)
+            written_rows += len(rows)
+            null_rows += sum(1 for row in rows if row[1] == '' or row[2] == '')
     
     logger.info(f"Exported {written_rows} rows to {output_file}")
     if null_rows > 0:
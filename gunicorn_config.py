@@ -1,10 +1,35 @@
 # Gunicorn configuration for Railway
+# Usage: gunicorn -c gunicorn_config.py api_server:app
 import os
 bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Parser state (running flags, executors, stop events) lives in the worker process,
+# so there must be exactly one worker: a second one would report its own "not running"
+# state and could start a parallel parser. Concurrency comes from threads instead -
+# all endpoints are I/O-bound (DB queries, file reads, file sends).
 workers = 1
-threads = 2
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = 1000
+
 timeout = 120
 keepalive = 5
-worker_class = "sync"
+
+# /download returns send_file responses (wsgi.file_wrapper): gunicorn passes them to
+# sendfile(2), so export files go from page cache to the socket without a userspace copy
+sendfile = True
+
+
+def post_worker_init(worker):
+    # Open the DB pool and prime the /status cache before the first request.
+    # Done per worker after fork (not via preload_app) so DB sockets are never shared across processes.
+    from api_server import warmup
+    warmup()
 
 
+def worker_exit(server, worker):
+    # Stop running parsers while their executors still accept work: without this the interpreter
+    # shuts the executors down first and in-flight apps fail with "cannot schedule new futures".
+    # The wait is bounded by graceful_timeout: after it the arbiter kills the worker anyway.
+    from api_server import shutdown_parsers
+    shutdown_parsers()
@@ -9,6 +9,29 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import urllib.parse as urlparse
 
+def migrate_price_export_index(cursor):
+    """
+    Заменить idx_price_app_datetime покрывающим индексом idx_price_export для экспорта ITAD
+    (ORDER BY app_id, datetime). Разовая миграция: CONCURRENTLY не блокирует запись в
+    price_history, но требует autocommit. Прерванная сборка оставляет невалидный индекс -
+    он пересоздается, а старый индекс удаляется только после успешной сборки нового.
+    """
+    cursor.execute("""
+        SELECT i.indisvalid FROM pg_index i
+        WHERE i.indexrelid = to_regclass('idx_price_export')
+    """)
+    row = cursor.fetchone()
+    if row and not row[0]:
+        print("⚠️  Индекс idx_price_export невалиден (прерванная сборка) - пересоздание...")
+        cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_price_export")
+    
+    cursor.execute("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_price_export ON price_history(app_id, datetime)
+        INCLUDE (price_final, currency_symbol, currency_name)
+    """)
+    cursor.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_price_app_datetime")
+
+
 def init_postgres_database(database_url: str):
     """Инициализировать PostgreSQL базу данных"""
     
@@ -69,7 +92,7 @@ def init_postgres_database(database_url: str):
         
         # Индексы для price_history
         print("📇 Создание индексов для price_history...")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_app_datetime ON price_history(app_id, datetime)")
+        migrate_price_export_index(cursor)
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_app ON price_history(app_id)")
         print("✅ Индексы созданы")
         
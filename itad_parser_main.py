@@ -5,8 +5,9 @@ Supports checkpoint/resume and progress tracking
 import logging
 import signal
 import sys
+import threading
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import config
 from itad_price_parser_hybrid import ITADPriceParserHybrid
 from checkpoint import CheckpointManager
@@ -27,19 +28,22 @@ logger = logging.getLogger(__name__)
 class ITADParserMain:
     """Main ITAD parser orchestrator"""
     
-    def __init__(self, app_ids_file: Path = None):
+    def __init__(self, app_ids_file: Path = None, stop_event: Optional[threading.Event] = None):
         """
         Initialize ITAD parser
         
         Args:
             app_ids_file: Path to file with app IDs (one per line)
+            stop_event: Event that requests a graceful stop when set (e.g. by the API server);
+                shared with the price parser, so one set() stops both
         """
         self.app_ids_file = app_ids_file or config.APP_IDS_FILE
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
         self.database = Database()
         self.checkpoint_manager = CheckpointManager(self.database)
-        self.parser = ITADPriceParserHybrid()
+        self.parser = ITADPriceParserHybrid(stop_event=self.stop_event, database=self.database,
+                                            checkpoint_manager=self.checkpoint_manager)
         self.progress_tracker = ProgressTracker(self.checkpoint_manager)
-        self.running = True
         
         # Setup signal handlers
         try:
@@ -49,11 +53,22 @@ class ITADParserMain:
             # Signal handlers can only be set in main thread
             logger.debug("Signal handlers skipped (running in thread)")
     
+    @property
+    def running(self) -> bool:
+        """True until a stop has been requested (kept for callers that still use the old flag)"""
+        return not self.stop_event.is_set()
+    
+    @running.setter
+    def running(self, value: bool):
+        if value:
+            self.stop_event.clear()
+        else:
+            self.stop_event.set()
+    
     def _signal_handler(self, signum, frame):
         """Handle interrupt signals"""
         logger.info("Received interrupt signal, shutting down gracefully...")
-        self.running = False
-        self.parser.running = False
+        self.stop_event.set()
         try:
             self.checkpoint_manager.save_checkpoint()
             logger.info("Checkpoint saved. You can resume parsing by running again.")
@@ -124,8 +139,8 @@ class ITADParserMain:
             batches_completed = 0
             
             for batch_num, batch_app_ids in enumerate(batches, 1):
-                if not self.running:
-                    logger.info("Parser stopped by user signal (self.running = False)")
+                if self.stop_event.is_set():
+                    logger.info("Parser stopped by user signal (stop_event set)")
                     logger.info(f"Processed {batch_num - 1}/{total_batches} batches before stop")
                     break
                 
@@ -135,6 +150,7 @@ class ITADParserMain:
                 
                 try:
                     # Mark apps as processing
+                    self.checkpoint_manager.start_batch()
                     for app_id in batch_app_ids:
                         self.checkpoint_manager.mark_itad_processing(app_id)
                     
@@ -164,8 +180,7 @@ class ITADParserMain:
                     
                 except KeyboardInterrupt:
                     logger.info("Parser interrupted by user (KeyboardInterrupt)")
-                    self.running = False
-                    self.parser.running = False
+                    self.stop_event.set()
                     break
                     
                 except Exception as e:
@@ -200,6 +215,10 @@ class ITADParserMain:
             logger.error(f"Fatal error: {e}", exc_info=True)
             raise
         finally:
+            try:
+                self.checkpoint_manager.flush()
+            except Exception as e:
+                logger.error(f"Error writing queued status updates: {e}")
             self.database.close()
 
 
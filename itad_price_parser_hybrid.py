@@ -4,7 +4,7 @@ Stage 1: Storelow (batched) to determine available currencies
 Stage 2: History (parallel) only for available currencies
 """
 import logging
-import time
+import threading
 from typing import List, Dict, Optional, Set
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -25,25 +25,42 @@ logger = logging.getLogger(__name__)
 class ITADPriceParserHybrid:
     """Hybrid ITAD price parser with storelow + history approach"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, stop_event: Optional[threading.Event] = None,
+                 database: Optional[Database] = None, checkpoint_manager: Optional[CheckpointManager] = None):
         """
         Initialize ITAD hybrid price parser
         
         Args:
             api_key: ITAD API key (optional, can be set in config)
+            stop_event: Event that requests a graceful stop when set (shared with ITADParserMain)
+            database: Database to use (shared with ITADParserMain, so the run keeps one connection)
+            checkpoint_manager: Checkpoint manager to use (shared with ITADParserMain, so status
+                updates from both are queued and flushed in order)
         """
         self.client = ITADAPIClient(api_key)
-        self.database = Database()
-        self.checkpoint_manager = CheckpointManager(self.database)
+        self.database = database if database is not None else Database()
+        self.checkpoint_manager = checkpoint_manager if checkpoint_manager is not None else CheckpointManager(self.database)
         self.currencies = get_all_currencies()
         self.parallel_threads = config.ITAD_PARALLEL_THREADS
-        self.running = True
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
         
         # Cache for UUIDs per batch
         self._uuid_cache = {}
         
         logger.info(f"Initialized ITAD Hybrid Parser with {self.parallel_threads} parallel threads")
     
+    @property
+    def running(self) -> bool:
+        """True until a stop has been requested (kept for callers that still use the old flag)"""
+        return not self.stop_event.is_set()
+    
+    @running.setter
+    def running(self, value: bool):
+        if value:
+            self.stop_event.clear()
+        else:
+            self.stop_event.set()
+    
     def parse_price_history_batch(self, app_ids: List[int], batch_number: int) -> Dict[str, int]:
         """
         Parse price history for a batch using hybrid approach
@@ -168,8 +185,9 @@ class ITADPriceParserHybrid:
             
             try:
                 # Storelow request for entire batch (batched!)
-                # Add delay between storelow requests to avoid rate limiting
-                time.sleep(config.ITAD_REQUEST_DELAY)
+                # Add delay between storelow requests to avoid rate limiting (a stop cuts it short)
+                if self.stop_event.wait(config.ITAD_REQUEST_DELAY):
+                    break
                 
                 storelow_result = self.client.get_store_lowest_prices(
                     app_ids, 
@@ -6,8 +6,9 @@ import asyncio
 import logging
 import signal
 import sys
+import threading
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import time
 
 import config
@@ -17,7 +18,7 @@ from batch_manager import BatchManager
 from checkpoint import CheckpointManager
 from ccu_parser import CCUParser
 from price_parser import PriceParser
-from progress import ProgressTracker
+from progress import ProgressTracker, RunCounters
 from steamcharts_parser import SteamChartsParser
 
 # Setup logging
@@ -36,12 +37,15 @@ logger = logging.getLogger(__name__)
 class SteamDBParser:
     """Main parser class"""
     
-    def __init__(self, data_source: str = 'steamcharts'):
+    def __init__(self, data_source: str = 'steamcharts', stop_event: Optional[threading.Event] = None,
+                 counters: Optional[RunCounters] = None):
         """
         Initialize parser
         
         Args:
             data_source: 'steamcharts' or 'steamdb' (default: 'steamcharts')
+            stop_event: Event that requests a graceful stop when set (e.g. by the API server)
+            counters: In-memory per-run counters shared with the caller (e.g. for /status)
         """
         self.database = Database()
         self.browser_manager = None
@@ -52,11 +56,12 @@ class SteamDBParser:
             self.ccu_parser = SteamChartsParser()
             self.price_parser = None  # Price parsing not implemented for SteamCharts
         else:
-            self.ccu_parser = CCUParser()
+            self.ccu_parser = CCUParser(on_challenge_passed=self._save_clearance_cookies)
             self.price_parser = PriceParser()
         
         self.progress_tracker = None
-        self.running = True
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.counters = counters if counters is not None else RunCounters()
         
         # Setup signal handlers only in main thread
         # Signal handlers don't work in threads, so we skip them when running in a thread
@@ -68,10 +73,22 @@ class SteamDBParser:
             # This is expected when running in a thread (e.g., from API server)
             logger.debug("Signal handlers skipped (running in thread)")
     
+    @property
+    def running(self) -> bool:
+        """True until a stop has been requested (kept for callers that still use the old flag)"""
+        return not self.stop_event.is_set()
+    
+    @running.setter
+    def running(self, value: bool):
+        if value:
+            self.stop_event.clear()
+        else:
+            self.stop_event.set()
+    
     def _signal_handler(self, signum, frame):
         """Handle interrupt signals"""
         logger.info("Received interrupt signal, shutting down gracefully...")
-        self.running = False
+        self.stop_event.set()
         # Save checkpoint when signal is received
         try:
             if self.checkpoint_manager:
@@ -80,6 +97,21 @@ class SteamDBParser:
         except Exception as e:
             logger.error(f"Error saving checkpoint: {e}")
     
+    async def _save_clearance_cookies(self, context):
+        """Save cookies as soon as a context passes Cloudflare, so the other contexts reuse the clearance"""
+        if self.browser_manager:
+            await self.browser_manager.save_cookies_from_context(context)
+            logger.info("Cloudflare challenge passed - cookies saved for other contexts")
+    
+    def _flush_status_updates(self):
+        """Write app statuses queued by the checkpoint manager (on exit paths; failures are logged, not raised)"""
+        if not self.checkpoint_manager:
+            return
+        try:
+            self.checkpoint_manager.flush()
+        except Exception as exc:
+            logger.error(f"Error writing queued status updates: {exc}")
+    
     def load_app_ids(self) -> List[int]:
         """Load APP IDs from file"""
         if not config.APP_IDS_FILE.exists():
@@ -96,9 +128,20 @@ class SteamDBParser:
         logger.info(f"Loaded {len(app_ids)} APP IDs from file")
         return app_ids
     
+    def _mark_app_error(self, app_id: int, error_type: str, error_message: str, url: str = None):
+        """
+        Mark an app error unless a stop was requested: failures caused by the shutdown itself
+        (cancelled requests, closed executors) must not turn pending apps into errors
+        """
+        if self.stop_event.is_set():
+            logger.debug(f"Stopping - leaving app_id {app_id} for the next run ({error_type}: {error_message})")
+            return
+        self.checkpoint_manager.mark_app_error(app_id, error_type, error_message, url)
+    
     async def process_batch_async(self, context, batch: List[int]):
         """Process a batch of APP IDs asynchronously"""
         results = {'ccu': {}, 'price': {}}
+        self.checkpoint_manager.start_batch()
         
         try:
             if self.data_source == 'steamcharts':
@@ -115,7 +158,7 @@ class SteamDBParser:
                             self.checkpoint_manager.mark_ccu_done(app_id, len(avg_data))
                             results['ccu'][app_id] = avg_data
                         else:
-                            self.checkpoint_manager.mark_app_error(
+                            self._mark_app_error(
                                 app_id, 'ccu', 'No data returned',
                                 config.STEAMCHARTS_API_URL.format(appid=app_id)
                             )
@@ -123,7 +166,7 @@ class SteamDBParser:
                             
                     except Exception as e:
                         logger.error(f"Error processing SteamCharts data for app_id {app_id}: {e}")
-                        self.checkpoint_manager.mark_app_error(
+                        self._mark_app_error(
                             app_id, 'ccu', str(e),
                             config.STEAMCHARTS_API_URL.format(appid=app_id)
                         )
@@ -140,8 +183,8 @@ class SteamDBParser:
                         self.database.save_ccu_data(app_id, ccu_data, value_type='avg')
                         self.checkpoint_manager.mark_ccu_done(app_id, len(ccu_data))
                     else:
-                        self.checkpoint_manager.mark_app_error(app_id, 'ccu', 'No data returned', 
-                                                              f"{config.STEAMDB_COMPARE_URL}{','.join(map(str, batch))}")
+                        self._mark_app_error(app_id, 'ccu', 'No data returned', 
+                                                 f"{config.STEAMDB_COMPARE_URL}{','.join(map(str, batch))}")
                 
                 # Delay between requests
                 await asyncio.sleep(config.DELAY_BETWEEN_REQUESTS)
@@ -160,12 +203,12 @@ class SteamDBParser:
                                 if ccu_count > 0:
                                     self.checkpoint_manager.mark_app_completed(app_id, ccu_count, len(price_data))
                             else:
-                                self.checkpoint_manager.mark_app_error(app_id, 'price', 'No data returned',
-                                                                      f"{config.STEAMDB_APP_URL}/{app_id}/")
+                                self._mark_app_error(app_id, 'price', 'No data returned',
+                                                         f"{config.STEAMDB_APP_URL}/{app_id}/")
                         except Exception as e:
                             logger.error(f"Error processing Price for app_id {app_id}: {e}")
-                            self.checkpoint_manager.mark_app_error(app_id, 'price', str(e),
-                                                                  f"{config.STEAMDB_APP_URL}/{app_id}/")
+                            self._mark_app_error(app_id, 'price', str(e),
+                                                       f"{config.STEAMDB_APP_URL}/{app_id}/")
                         
                         await asyncio.sleep(config.DELAY_BETWEEN_REQUESTS)
             
@@ -175,15 +218,26 @@ class SteamDBParser:
                 error_url = (config.STEAMCHARTS_API_URL.format(appid=app_id) 
                            if self.data_source == 'steamcharts' 
                            else f"{config.STEAMDB_COMPARE_URL}{','.join(map(str, batch))}")
-                self.checkpoint_manager.mark_app_error(app_id, 'ccu', str(e), error_url)
+                self._mark_app_error(app_id, 'ccu', str(e), error_url)
+            results['ccu'] = {app_id: [] for app_id in batch}
+        
+        # Per-run counters (the durable per-app state is already written by the checkpoint manager);
+        # empty results after a stop request are interrupted work, not errors
+        stopping = self.stop_event.is_set()
+        for data in results['ccu'].values():
+            if data:
+                self.counters.incr('completed')
+            elif not stopping:
+                self.counters.incr('errors')
         
         return results
     
-    async def _process_batch_with_context(self, context, batch: List[int], batch_manager: BatchManager):
+    async def _process_batch_with_context(self, context, batch_index: int, batch: List[int],
+                                          batch_manager: BatchManager):
         """Process batch and return context to pool"""
         try:
             await self.process_batch_async(context, batch)
-            batch_manager.mark_batch_processed(batch)
+            batch_manager.mark_batch_processed(batch_index)
         finally:
             await self.browser_manager.return_context(context)
     
@@ -223,15 +277,16 @@ class SteamDBParser:
         if self.data_source == 'steamcharts':
             # SteamCharts: process without browser context
             try:
-                while batch_manager.has_pending_batches() and self.running:
-                    batch = batch_manager.get_next_batch()
-                    if not batch:
+                while batch_manager.has_pending_batches() and not self.stop_event.is_set():
+                    next_batch = batch_manager.get_next_batch()
+                    if not next_batch:
                         break
+                    batch_index, batch = next_batch
                     
                     try:
                         # Process batch (no context needed for API)
                         await self.process_batch_async(None, batch)
-                        batch_manager.mark_batch_processed(batch)
+                        batch_manager.mark_batch_processed(batch_index)
                         processed_batches += 1
                         
                         # Update progress
@@ -246,8 +301,10 @@ class SteamDBParser:
                         logger.error(f"Error processing batch: {e}")
                         # Continue with next batch even if this one failed
             finally:
+                self._flush_status_updates()
+                
                 # Save checkpoint before closing
-                if not self.running:
+                if self.stop_event.is_set():
                     logger.info("Saving checkpoint before shutdown...")
                     self.checkpoint_manager.save_checkpoint()
                 
@@ -256,26 +313,23 @@ class SteamDBParser:
                     await self.ccu_parser.close()
         
         else:
-            # SteamDB: original browser-based processing
-            context = await self.browser_manager.get_context()
-            
-            try:
-                while batch_manager.has_pending_batches() and self.running:
-                    batch = batch_manager.get_next_batch()
-                    if not batch:
-                        break
+            # SteamDB: up to STEAMDB_WORKERS workers (each with a pooled context), each takes the next batch
+            # as soon as its own is done
+            # (a slow Compare page delays only its worker, not the whole run)
+            async def worker():
+                nonlocal processed_batches
+                while not self.stop_event.is_set():
+                    next_batch = batch_manager.get_next_batch()
+                    if not next_batch:
+                        return
+                    batch_index, batch = next_batch
                     
+                    # Contexts share the session through the cookies file (reapplied by get_context)
+                    context = await self.browser_manager.get_context()
                     try:
-                        # Process batch using the same context (maintains session)
-                        await self.process_batch_async(context, batch)
-                        batch_manager.mark_batch_processed(batch)
+                        await self._process_batch_with_context(context, batch_index, batch, batch_manager)
                         processed_batches += 1
                         
-                        # Save cookies after each batch to maintain session
-                        cookies = await context.cookies()
-                        if cookies:
-                            self.browser_manager._save_cookies(cookies)
-                        
                         # Update progress
                         self.progress_tracker.update_progress()
                         
@@ -290,14 +344,18 @@ class SteamDBParser:
                     except Exception as e:
                         logger.error(f"Error processing batch: {e}")
                         # Continue with next batch even if this one failed
+            
+            try:
+                workers = min(config.STEAMDB_WORKERS, len(self.browser_manager.contexts))
+                await asyncio.gather(*(worker() for _ in range(workers)))
             finally:
+                self._flush_status_updates()
+                
                 # Save checkpoint before closing
-                if not self.running:
+                if self.stop_event.is_set():
                     logger.info("Saving checkpoint before shutdown...")
                     self.checkpoint_manager.save_checkpoint()
                 
-                # Return context to pool
-                await self.browser_manager.return_context(context)
                 await self.browser_manager.close()
         
         # Final statistics
@@ -312,6 +370,8 @@ class SteamDBParser:
             asyncio.run(self.run_async())
         except KeyboardInterrupt:
             logger.info("Interrupted by user - saving checkpoint...")
+            self._flush_status_updates()
+            
             # Save checkpoint before exiting
             try:
                 if self.checkpoint_manager:
@@ -333,6 +393,8 @@ class SteamDBParser:
                     logger.error(f"Error closing SteamCharts parser: {e}")
         except Exception as e:
             logger.error(f"Fatal error: {e}", exc_info=True)
+            self._flush_status_updates()
+            
             # Try to save checkpoint even on fatal error
             try:
                 if self.checkpoint_manager:
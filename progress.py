@@ -2,7 +2,9 @@
 Progress tracker and statistics display
 """
 import logging
+import threading
 import time
+from collections import Counter
 from typing import Dict
 from datetime import datetime, timedelta
 import config
@@ -11,6 +13,68 @@ from checkpoint import CheckpointManager
 logger = logging.getLogger(__name__)
 
 
+class RunCounters:
+    """
+    In-memory counters for the current parser run.
+    
+    Updated by the parser thread and read by API request threads, so /status can report
+    live progress of the run without querying app_status.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._counts = Counter()
+        self._version = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._last_update = None
+    
+    def incr(self, key: str, amount: int = 1):
+        """Increment a counter"""
+        with self._changed:
+            self._counts[key] += amount
+            self._last_update = time.time()
+            self._version += 1
+            self._changed.notify_all()
+    
+    def finish(self):
+        """Mark the run as finished (freezes elapsed time) and wake up waiters"""
+        with self._changed:
+            self.finished_at = time.time()
+            self._version += 1
+            self._changed.notify_all()
+    
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """
+        Block until the counters change after the given version or the timeout expires
+        
+        Returns:
+            Current version (pass it to the next call)
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+    
+    def snapshot(self) -> Dict:
+        """Consistent copy of the counters"""
+        with self._lock:
+            counts = dict(self._counts)
+            last_update = self._last_update
+            finished_at = self.finished_at
+        
+        elapsed = (finished_at or time.time()) - self.started_at
+        processed = counts.get('completed', 0) + counts.get('errors', 0)
+        return {
+            'processed': processed,
+            'completed': counts.get('completed', 0),
+            'errors': counts.get('errors', 0),
+            'elapsed_seconds': round(elapsed, 1),
+            'speed_per_hour': round(processed / elapsed * 3600, 1) if elapsed > 0 else 0.0,
+            'last_update': datetime.fromtimestamp(last_update).isoformat() if last_update else None
+        }
+
+
 class ProgressTracker:
     """Tracks and displays parsing progress"""
     
@@ -19,12 +19,13 @@ print(f"Starting gunicorn on port {port_int}")
 # Запускаем gunicorn через subprocess
 import subprocess
 
+# Остальные настройки (gthread, threads, timeout) - в gunicorn_config.py
+config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn_config.py')
+
 cmd = [
     'gunicorn',
+    '-c', config_file,
     '--bind', f'0.0.0.0:{port_int}',
-    '--workers', '1',
-    '--threads', '2',
-    '--timeout', '120',
     'api_server:app'
 ]
 
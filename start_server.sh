@@ -5,6 +5,6 @@
 PORT=${PORT:-8080}
 
 echo "Starting API server on port $PORT"
-exec gunicorn --bind "0.0.0.0:${PORT}" --workers 1 --threads 2 --timeout 120 api_server:app
+exec gunicorn -c "$(dirname "$0")/gunicorn_config.py" --bind "0.0.0.0:${PORT}" api_server:app
 
 
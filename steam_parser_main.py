@@ -16,27 +16,19 @@ class SteamParserMain:
     def __init__(self):
         """Initialize Steam parser main"""
         self.database = Database()
-        self.parser = SteamPriceParser()
+        self.parser = SteamPriceParser(self.database)
         self.running = True
     
     def load_error_app_ids(self) -> List[int]:
         """Load App IDs with itad_error status from database"""
         cursor = self.database._get_cursor()
         
-        if self.database.use_postgresql:
-            cursor.execute("""
-                SELECT app_id
-                FROM app_status
-                WHERE status = 'itad_error'
-                ORDER BY app_id
-            """)
-        else:
-            cursor.execute("""
-                SELECT app_id
-                FROM app_status
-                WHERE status = 'itad_error'
-                ORDER BY app_id
-            """)
+        cursor.execute("""
+            SELECT app_id
+            FROM app_status
+            WHERE status = 'itad_error'
+            ORDER BY app_id
+        """)
         
         rows = cursor.fetchall()
         
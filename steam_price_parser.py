@@ -22,10 +22,15 @@ logger = logging.getLogger(__name__)
 class SteamPriceParser:
     """Parser for current Steam prices"""
     
-    def __init__(self):
-        """Initialize Steam price parser"""
+    def __init__(self, database: Optional[Database] = None):
+        """
+        Initialize Steam price parser
+        
+        Args:
+            database: Database to use (shared with SteamParserMain, so the run keeps one connection)
+        """
         self.client = SteamStoreAPIClient()
-        self.database = Database()
+        self.database = database if database is not None else Database()
         self.currencies = get_all_currencies()
         self.parallel_threads = config.STEAM_PARSER_THREADS
         self.running = True
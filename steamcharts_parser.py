@@ -3,16 +3,134 @@ SteamCharts API parser for CCU data collection
 """
 import logging
 import asyncio
+import multiprocessing
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Optional
 from datetime import datetime
 import aiohttp
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 import config
 
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'  # C parser: faster than html.parser
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 logger = logging.getLogger(__name__)
 
+# Only the statistics tables are read from app pages, so the rest of the document is never built
+ONLY_TABLES = SoupStrainer('table')
+
+
+def parse_peak_table(html_content: str, app_id: int) -> List[Dict]:
+    """
+    Extract monthly peak players from a SteamCharts app page.
+    Runs in the HTML worker process, so it takes and returns plain picklable data.
+    
+    Returns:
+        List of {'datetime': 'YYYY-MM-01 00:00:00', 'players': int} dicts
+    """
+    soup = BeautifulSoup(html_content, HTML_PARSER, parse_only=ONLY_TABLES)
+    
+    # Find the table with player statistics
+    # Table structure: Month | Avg. Players | Gain | % Gain | Peak Players
+    table = soup.find('table', class_='common-table')
+    
+    if not table:
+        # Try to find any table with "Peak Players" header
+        tables = soup.find_all('table')
+        for t in tables:
+            headers = t.find_all('th')
+            if any('peak' in h.get_text().lower() for h in headers):
+                table = t
+                break
+    
+    if not table:
+        logger.warning(f"Could not find statistics table for app_id {app_id}")
+        return []
+    
+    peak_data = []
+    rows = table.find_all('tr')[1:]  # Skip header row
+    
+    for row in rows:
+        cells = row.find_all('td')
+        if len(cells) < 5:  # Need at least 5 columns (Month, Avg, Gain, %Gain, Peak)
+            continue
+        
+        try:
+            # Parse month/date (first column, index 0)
+            month_str = cells[0].get_text().strip()
+            # Parse peak players (fifth column, index 4)
+            peak_str = cells[4].get_text().strip().replace(',', '')
+            
+            if not peak_str or not peak_str.isdigit():
+                continue
+            
+            peak_value = int(peak_str)
+            
+            # Convert month string to datetime
+            # Format can be "November 2025", "Last 30 Days", etc.
+            try:
+                # Skip "Last 30 Days" and similar rows
+                if 'last' in month_str.lower() or 'days' in month_str.lower():
+                    continue
+                
+                # Format: "November 2025" or "Nov 2025"
+                month_str_clean = month_str.strip()
+                if len(month_str_clean.split()) == 2:
+                    # Try full month name first: "November 2025"
+                    try:
+                        dt = datetime.strptime(month_str_clean, '%B %Y')
+                    except ValueError:
+                        # Try abbreviated: "Nov 2025"
+                        dt = datetime.strptime(month_str_clean, '%b %Y')
+                elif '-' in month_str_clean:
+                    # Format: "2024-01"
+                    dt = datetime.strptime(month_str_clean, '%Y-%m')
+                else:
+                    # Try other formats
+                    dt = datetime.strptime(month_str_clean, '%Y-%m-%d')
+                
+                # Use first day of month for monthly data
+                datetime_str = dt.strftime('%Y-%m-01 %H:%M:%S')
+                
+                peak_data.append({
+                    'datetime': datetime_str,
+                    'players': peak_value
+                })
+            except ValueError as e:
+                logger.debug(f"Could not parse date '{month_str}' for app_id {app_id}: {e}")
+                continue
+                
+        except (ValueError, IndexError) as e:
+            logger.debug(f"Error parsing table row for app_id {app_id}: {e}")
+            continue
+    
+    return peak_data
+
+
+_html_pool = None
+_html_pool_lock = threading.Lock()
+
+
+def _get_html_pool() -> ProcessPoolExecutor:
+    """Process pool for HTML parsing, created on first use"""
+    global _html_pool
+    
+    if _html_pool is None:
+        with _html_pool_lock:
+            if _html_pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                _html_pool = ProcessPoolExecutor(
+                    max_workers=config.STEAMCHARTS_HTML_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _html_pool
+
 
 class RateLimiter:
     """Token bucket rate limiter for API requests"""
@@ -233,81 +351,9 @@ class SteamChartsParser:
                     return []
                 
                 html_content = await response.text()
-                soup = BeautifulSoup(html_content, 'html.parser')
-                
-                # Find the table with player statistics
-                # Table structure: Month | Avg. Players | Gain | % Gain | Peak Players
-                table = soup.find('table', class_='common-table')
-                
-                if not table:
-                    # Try to find any table with "Peak Players" header
-                    tables = soup.find_all('table')
-                    for t in tables:
-                        headers = t.find_all('th')
-                        if any('peak' in h.get_text().lower() for h in headers):
-                            table = t
-                            break
-                
-                if not table:
-                    logger.warning(f"Could not find statistics table for app_id {app_id}")
-                    return []
-                
-                peak_data = []
-                rows = table.find_all('tr')[1:]  # Skip header row
-                
-                for row in rows:
-                    cells = row.find_all('td')
-                    if len(cells) < 5:  # Need at least 5 columns (Month, Avg, Gain, %Gain, Peak)
-                        continue
-                    
-                    try:
-                        # Parse month/date (first column, index 0)
-                        month_str = cells[0].get_text().strip()
-                        # Parse peak players (fifth column, index 4)
-                        peak_str = cells[4].get_text().strip().replace(',', '')
-                        
-                        if not peak_str or not peak_str.isdigit():
-                            continue
-                        
-                        peak_value = int(peak_str)
-                        
-                        # Convert month string to datetime
-                        # Format can be "November 2025", "Last 30 Days", etc.
-                        try:
-                            # Skip "Last 30 Days" and similar rows
-                            if 'last' in month_str.lower() or 'days' in month_str.lower():
-                                continue
-                            
-                            # Format: "November 2025" or "Nov 2025"
-                            month_str_clean = month_str.strip()
-                            if len(month_str_clean.split()) == 2:
-                                # Try full month name first: "November 2025"
-                                try:
-                                    dt = datetime.strptime(month_str_clean, '%B %Y')
-                                except ValueError:
-                                    # Try abbreviated: "Nov 2025"
-                                    dt = datetime.strptime(month_str_clean, '%b %Y')
-                            elif '-' in month_str_clean:
-                                # Format: "2024-01"
-                                dt = datetime.strptime(month_str_clean, '%Y-%m')
-                            else:
-                                # Try other formats
-                                dt = datetime.strptime(month_str_clean, '%Y-%m-%d')
-                            
-                            # Use first day of month for monthly data
-                            datetime_str = dt.strftime('%Y-%m-01 %H:%M:%S')
-                            
-                            peak_data.append({
-                                'datetime': datetime_str,
-                                'players': peak_value
-                            })
-                        except ValueError as e:
-                            logger.debug(f"Could not parse date '{month_str}' for app_id {app_id}: {e}")
-                            continue
-                            
-                    except (ValueError, IndexError) as e:
-                        logger.debug(f"Error parsing table row for app_id {app_id}: {e}")
-                        continue
+                # Tree building is CPU-bound Python code: keep it off the parser's (and API server's) GIL
+                loop = asyncio.get_running_loop()
+                peak_data = await loop.run_in_executor(_get_html_pool(), parse_peak_table, html_content, app_id)
                 
                 logger.debug(f"Extracted {len(peak_data)} peak data points from HTML for app_id {app_id}")
                 return peak_data
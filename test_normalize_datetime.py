@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Проверка CCUParser._normalize_datetime: быстрый путь не должен менять результат
+для строк, которые раньше не распознавались или разбирались по формату
+"""
+from ccu_parser import CCUParser
+
+parser = CCUParser()
+
+
+def test_api_format():
+    assert parser._normalize_datetime('2024-01-15 10:20:30') == '2024-01-15 10:20:30'
+    assert parser._normalize_datetime('2024-01-15T10:20:30') == '2024-01-15 10:20:30'
+    assert parser._normalize_datetime('2024-01-15T10:20:30Z') == '2024-01-15 10:20:30'
+    assert parser._normalize_datetime('2024-01-15 10:20:30.123456') == '2024-01-15 10:20:30'
+
+
+def test_date_only_kept():
+    assert parser._normalize_datetime('2024-01-15') == '2024-01-15'
+
+
+def test_offset_kept():
+    assert parser._normalize_datetime('2024-01-15T10:20:30+02:00') == '2024-01-15T10:20:30+02:00'
+    assert parser._normalize_datetime('2024-01-15 10:20:30+00:00') == '2024-01-15 10:20:30+00:00'
+
+
+if __name__ == "__main__":
+    test_api_format()
+    test_date_only_kept()
+    test_offset_kept()
+    print("✅ Все проверки пройдены")